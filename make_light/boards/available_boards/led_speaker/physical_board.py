@@ -9,12 +9,15 @@ import os
 import time
 import atexit
 
+import numpy as np
 from kano_peripherals.speaker_leds.driver.high_level import \
     get_speakerleds_interface
 from kano.logging import logger
 
 from make_light.boards.base.physical_board import PhysicalBoard
 from make_light.boards.base.coords.polar import Polar
+from make_light.boards.base.framebuffer import Framebuffer
+from make_light.boards.base.colours.colour_palette import BLACK
 
 
 def ensure_api(func):
@@ -56,69 +59,81 @@ class LEDSpeakerPhysical(PhysicalBoard, Polar):
         self.token = os.environ['API_TOKEN'] if 'API_TOKEN' in os.environ else ''
 
         self.api = get_speakerleds_interface()  # TODO: can be None
+        self.num_leds = len(self._rings[0])
 
-        if not self.api:
-            return
+        if self.api:
+            self.__lock()
+            atexit.register(self._clean_up)
+
+            self.num_leds = self.api.get_num_leds()
 
-        self.__lock()
-        atexit.register(self._clean_up)
+        # The colours of the LEDs, which are all sent in a single call
+        self._framebuffer = Framebuffer((self.num_leds,), 3)
 
-        self.num_leds = self.api.get_num_leds()
+        # Whether the LEDs were held back by a batch() block
+        self._batch_pending = False
 
     @ensure_api
     def detect_board(self):
         return self.api.detect()
 
     def clear(self):
-        self.__set_leds_off()
+        self._framebuffer.fill(0)
+
+        if self._batch_depth:
+            self._batch_pending = True
+        else:
+            self.__set_leds_off()
+
+    def _end_batch(self):
+        if self._batch_pending:
+            self._batch_pending = False
+            self.__write_leds()
 
     def on(self, *args, **kwargs):
         leds, dummy_intensity = self._parse_coord_args(*args)
-        kwargs.update({'normalise': True})
         col = self._parse_colour_kwargs(**kwargs)
 
-        for led in leds:
-            self.__set_led(led[1], col)
+        self._framebuffer.set_leds(
+            [led[1] % self.num_leds for led in leds], col
+        )
+        self.__send_leds()
 
     def off(self, *args):
         leds, dummy_intensity = self._parse_coord_args(*args)
-        col = self.normalise_colour(__builtins__['black'])
-        for led in args:
-            self.__set_led(led[1], col)
+
+        self._framebuffer.set_leds(
+            [led[1] % self.num_leds for led in leds], BLACK
+        )
+        self.__send_leds()
 
     def all(self, **kwargs):
-        kwargs.update({'normalise': True})
         col = self._parse_colour_kwargs(**kwargs)
-        arg = [col for dummy in xrange(self.num_leds)]
-        self.__set_all_leds(arg)
+
+        self._framebuffer.fill(col)
+        self.__send_leds()
 
     def circle(self, **kwargs):
         self.all(**kwargs)
 
-    def arc(self, start, end, **kwargs):
-        kwargs.update({'normalise': True})
-        col = self._parse_colour_kwargs(**kwargs)
-
-        if type(start) == tuple:
-            dummy, start_idx = start
-        else:
-            start_idx = self.get_addr_from_coords((0, start))[1]
+    def frame(self, buffer):
+        colours = self._parse_frame(buffer)
 
-        if type(start) == tuple:
-            dummy, end_idx = end
-        else:
-            end_idx = self.get_addr_from_coords((0, end))[1]
+        self._framebuffer.pixels[:len(colours)] = colours[:self.num_leds]
+        self.__send_leds()
 
-        if start_idx > end_idx:
-            end_idx += self.num_leds
+    def arc(self, start, end, **kwargs):
+        col = self._parse_colour_kwargs(**kwargs)
 
-        for i in xrange(start_idx, end_idx + 1):
-            self.__set_led(i % self.num_leds, col)
+        self._framebuffer.set_leds(
+            self._get_arc_leds(0, start, end) % self.num_leds, col
+        )
+        self.__send_leds()
 
     def spin(self, delay, **kwargs):
         col = self._parse_colour_kwargs(**kwargs)
 
-        for led in __builtins__['board']:
+        for led in self.leds:
             self.on(led, colour=col)
             time.sleep(delay)
             self.clear()
@@ -183,18 +198,22 @@ class LEDSpeakerPhysical(PhysicalBoard, Polar):
         else:
             return self.api.set_all_leds(values)
 
-    @ensure_api
-    def __set_led(self, num, rgb):
+    def __send_leds(self):
+        if self._batch_depth:
+            self._batch_pending = True
+        else:
+            self.__write_leds()
+
+    def __write_leds(self):
         '''
+        Send the colours of all the LEDs in the framebuffer, normalised.
+
         FIXME: This translation layer is required to align A1 with north on the board.
                This should be moved into the API itself.
         '''
-        num = (num - 3) % self.num_leds
+        values = np.roll(self._framebuffer.pixels, -3, axis=0) / 255.
 
-        if self.token:
-            return self.api.set_led_with_token(num, rgb, self.token)
-        else:
-            return self.api.set_led(num, rgb)
+        return self.__set_all_leds([tuple(rgb) for rgb in values.tolist()])
 
 
 class Board(LEDSpeakerPhysical):
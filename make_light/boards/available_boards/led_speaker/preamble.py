@@ -15,12 +15,15 @@ elif 'POWERUP_MAKE' in os.environ:
 if simulation:
     from make_light.boards.available_boards.led_speaker.simulation_board \
         import LEDSpeaker
-    board = LEDSpeaker()
+    board = LEDSpeaker(debug=debug)
 else:
     from make_light.boards.available_boards.led_speaker.physical_board import \
         LEDSpeakerPhysical
     board = LEDSpeakerPhysical()
 
 light = board
+light.export_namespace(globals())
 light.clear()
-light.reset_exports()
+
+if 'POWERUP_AUTO_FLUSH' in os.environ:
+    light.set_auto_flush()
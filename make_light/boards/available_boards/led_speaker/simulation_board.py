@@ -21,9 +21,11 @@ class LEDSpeaker(CircularBoard):
     RING_THICKNESSES = [25]
     RING_OFFSETS = [-90]
 
-    def __init__(self):
+    def __init__(self, debug=False):
         CircularBoard.__init__(self)
 
+        self._debug = debug
+
         self.connected = True
 
     def arc(self, start, end, **kwargs):
@@ -35,7 +37,7 @@ class LEDSpeaker(CircularBoard):
     def spin(self, delay, **kwargs):
         col = self._parse_colour_kwargs(**kwargs)
 
-        for led in board:
+        for led in self.leds:
             self.on(led, colour=col)
             time.sleep(delay)
             self.clear()
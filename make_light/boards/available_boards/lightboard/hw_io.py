@@ -10,14 +10,15 @@ import serial
 import collections
 import numbers
 from contextlib import contextmanager
-from array import array
 from time import sleep
 
-from PIL import Image, ImageDraw, ImageFont, ImageColor
+import numpy as np
+from PIL import ImageColor
 
 from kano.logging import logger
 
-from make_light.paths import FONTS_DIR
+from make_light.boards.base.framebuffer import Framebuffer
+from make_light.boards.base.glyph_atlas import GlyphAtlas
 
 
 class LightBoardError(RuntimeError):
@@ -141,27 +142,21 @@ class LightBoardCommsDriver(object):
 
     def update_board(self, led_values):
         """ Pass a flattened list of pixel colour values to display on the board
-        :param led_values: List containing the colour values to be passed to
-                           the board. The numbers contained must be in the range
-                           [0, 255]
-        :types led_values: list of ints
+        :param led_values: List or array containing the colour values to be
+                           passed to the board. The numbers contained must be
+                           in the range [0, 255]
+        :types led_values: list of ints or numpy.ndarray
         :returns: True iff communication to the board was successful
         :rtype: bool
         """
+        led_values = np.asarray(led_values, dtype=np.uint8).ravel()
+
         # We need to prepend the \x55 char before sending board data
-        sanitised_array = array('B', (int('0x55', 16),))
+        packet = bytearray(b'\x55')
+        packet += led_values[:self.NUM_LEDS].tobytes()
 
         # Pad the input with zeroes if the length is not right
-        if len(led_values) < self.NUM_LEDS:
-            padding_needed = self.NUM_LEDS - len(led_values)
-            list_slice = led_values
-        else:
-            padding_needed = 0
-            list_slice = led_values[0: self.NUM_LEDS]
-
-        sanitised_array.fromlist(list_slice + padding_needed * [0])
-
-        packet = bytearray(sanitised_array)
+        packet += bytearray(self.NUM_LEDS + 1 - len(packet))
 
         ret = self._write_raw(packet)
 
@@ -221,7 +216,6 @@ class LightBoardHW(object):
     functions to draw basic shapes and animations
     """
     ASPECT_RATIO = 1.76
-    FONT = ImageFont.load(os.path.join(FONTS_DIR, 'atari-small.pil'))
     LIGHT_WIDTH = 9
     LIGHT_HEIGHT = 14
     _DIMENSIONS = (LIGHT_WIDTH, LIGHT_HEIGHT)
@@ -235,11 +229,9 @@ class LightBoardHW(object):
     ]
 
     def __init__(self):
-        self._lights_mode = 'L'
-        self._board_lights_image = Image.new(
-            self._lights_mode, self._DIMENSIONS
+        self._framebuffer = Framebuffer(
+            (self.LIGHT_HEIGHT, self.LIGHT_WIDTH), 1
         )
-        self._board_lights_draw = ImageDraw.Draw(self._board_lights_image)
         self._driver = LightBoardCommsDriver.get_inst()
         # By default this class is synchronous
         self._async = False
@@ -280,8 +272,7 @@ class LightBoardHW(object):
         """ Send the internally represented state to then HW. Similar to flush()
         but it doesn't clear the internal board after successful operation
         """
-        dat = [x >> 5 for x in self._board_lights_image.getdata()]
-        self._driver.update_board(dat)
+        self._driver.update_board(self._framebuffer.pixels >> 5)
 
     def _get_color(self, spec):
         """ Translate the spec to the appropriate colour
@@ -311,7 +302,33 @@ class LightBoardHW(object):
             )
 
         fill = self._get_color(intensity)
-        self._board_lights_draw.point(positions, fill=fill)
+        self._framebuffer.set_points(positions, fill)
+        if not self._async:
+            self.update_board()
+
+    def set_frame(self, values):
+        """ Set the intensity of all the pixels at once
+        :param values: The intensity of each pixel, row by row
+        :type values: Sequence of ints from 0 to 255 or numpy.ndarray
+        """
+        self._framebuffer.pixels[...] = np.asarray(
+            values, dtype=np.uint8
+        ).reshape(self._framebuffer.pixels.shape)
+
+        if not self._async:
+            self.update_board()
+
+    def blit(self, pixels, mask, where):
+        """ Copy an array of intensities onto the board where a mask is set
+        :param pixels: Array of (height, width, 1) intensities
+        :type pixels: numpy.ndarray
+        :param mask: Boolean array of (height, width)
+        :type mask: numpy.ndarray
+        :param where: The (x, y) position of the top left pixel
+        :type where: tuple
+        """
+        self._framebuffer.blit(pixels, mask, where)
+
         if not self._async:
             self.update_board()
 
@@ -327,7 +344,7 @@ class LightBoardHW(object):
         """
         fill = self._get_color(spec)
 
-        self._board_lights_draw.rectangle(((0, 0), self._DIMENSIONS), fill=fill)
+        self._framebuffer.fill(fill)
 
         if not self._async:
             self.update_board()
@@ -337,7 +354,9 @@ class LightBoardHW(object):
         """
         fill = self._get_color(spec)
 
-        self._board_lights_draw.rectangle((A, B), fill=fill)
+        self._framebuffer.draw(
+            lambda draw: draw.rectangle((A, B), fill=255), fill
+        )
 
         if not self._async:
             self.update_board()
@@ -347,7 +366,7 @@ class LightBoardHW(object):
         """
         fill = self._get_color(spec)
 
-        self._board_lights_draw.line((A, B), fill=fill)
+        self._framebuffer.draw(lambda draw: draw.line((A, B), fill=255), fill)
 
         if not self._async:
             self.update_board()
@@ -358,13 +377,11 @@ class LightBoardHW(object):
         fill = self._get_color(spec)
         x, y = where
         xsize = size * (1 / self.ASPECT_RATIO)
-        self._board_lights_draw.ellipse(
-            (
-                (x - int(xsize / 2), y - int(size / 2)),
-                (x + int(xsize / 2), y + int(size / 2))
-            ),
-            fill
+        box = (
+            (x - int(xsize / 2), y - int(size / 2)),
+            (x + int(xsize / 2), y + int(size / 2))
         )
+        self._framebuffer.draw(lambda draw: draw.ellipse(box, fill=255), fill)
         if not self._async:
             self.update_board()
 
@@ -373,7 +390,9 @@ class LightBoardHW(object):
         """
         fill = self._get_color(spec)
 
-        self._board_lights_draw.ellipse((A, B), fill=fill)
+        self._framebuffer.draw(
+            lambda draw: draw.ellipse((A, B), fill=255), fill
+        )
         if not self._async:
             self.update_board()
 
@@ -382,7 +401,9 @@ class LightBoardHW(object):
         """
         fill = self._get_color(spec)
 
-        self._board_lights_draw.arc(middle, start, end, fill=fill)
+        self._framebuffer.draw(
+            lambda draw: draw.arc(middle, start, end, fill=255), fill
+        )
         if not self._async:
             self.update_board()
 
@@ -391,7 +412,9 @@ class LightBoardHW(object):
         """
         fill = self._get_color(spec)
 
-        self._board_lights_draw.polygon([a, b, c], fill=fill)
+        self._framebuffer.draw(
+            lambda draw: draw.polygon([a, b, c], fill=255), fill
+        )
         if not self._async:
             self.update_board()
 
@@ -400,7 +423,9 @@ class LightBoardHW(object):
         """
         fill = self._get_color(spec)
 
-        self._board_lights_draw.polygon(points, fill=fill)
+        self._framebuffer.draw(
+            lambda draw: draw.polygon(points, fill=255), fill
+        )
         if not self._async:
             self.update_board()
 
@@ -409,16 +434,17 @@ class LightBoardHW(object):
         """
         if portrait:
             raise NotImplementedError
-        text = text + '    '
-        (text_width, text_height) = self.FONT.getsize(text)
-        for i in xrange(text_width):
-            self._board_lights_draw.rectangle(
-                ((self.LIGHT_WIDTH - i, 0), self._DIMENSIONS),
-                fill=self.BLACK
+        # The text is rendered once and slid across the board
+        strip = GlyphAtlas.get_inst().render(text + '    ')
+        pixels = strip.get_pixels(1, (self.WHITE,) * 3)
+
+        for i in xrange(strip.size[0]):
+            self._framebuffer.fill(
+                self.BLACK,
+                (max(0, self.LIGHT_WIDTH - i), 0) + self._DIMENSIONS
             )
-            self._board_lights_draw.text(
-                (self.LIGHT_WIDTH - i, top), text, font=self.FONT,
-                fill=self.WHITE
+            self._framebuffer.blit(
+                pixels, strip.mask, (self.LIGHT_WIDTH - i, top)
             )
             sleep(delay)
             if not self._async:
@@ -427,8 +453,9 @@ class LightBoardHW(object):
     def text(self, where, text):
         """ Display text on the board
         """
-        self._board_lights_draw.text(
-            where, text, font=self.FONT, fill=self.WHITE
+        strip = GlyphAtlas.get_inst().render(text)
+        self._framebuffer.blit(
+            strip.get_pixels(1, (self.WHITE,) * 3), strip.mask, where
         )
         if not self._async:
             self.update_board()
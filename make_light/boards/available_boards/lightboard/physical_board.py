@@ -22,12 +22,23 @@ class KanoLightBoardPhysical(PhysicalBoard, Cartesian):
         # FIXME
         return True
 
+    def _start_batch(self):
+        api.set_async()
+
+    def _end_batch(self):
+        api.update_board()
+        api.set_sync()
+
     def clear(self):
         api.set_to_all(False)
 
     def on(self, *args):
         leds, intensity = self._parse_coord_args(*args)
-        api.set_elements(leds, intensity)
+
+        if leds is self.leds:
+            api.set_to_all(intensity)
+        else:
+            api.set_elements(leds, intensity)
 
     def off(self, *args):
         api.unset_elements(args)
@@ -35,6 +46,10 @@ class KanoLightBoardPhysical(PhysicalBoard, Cartesian):
     def all(self, spec=True):
         api.set_to_all(spec)
 
+    def frame(self, buffer):
+        # The LEDs are lit at the brightness of the colours
+        api.set_frame(self._parse_frame(buffer).max(axis=1))
+
     def rectangle(self, A, B, spec=True):
         api.rectangle(A, B, spec)
 
@@ -56,6 +71,10 @@ class KanoLightBoardPhysical(PhysicalBoard, Cartesian):
     def polygon(self, points, spec=True):
         api.polygon(points, spec)
 
+    def blit(self, sprite, where, **kwargs):
+        pixels = sprite.get_pixels(1, self._parse_sprite_colour(**kwargs))
+        api.blit(pixels, sprite.mask, where)
+
     def scroll(self, text, delay=0.1, portrait=False, top=3):
         api.scroll(text, delay, portrait, top)
 
@@ -25,5 +25,8 @@ else:
     board = KanoLightBoardPhysical()
 
 light = board
+light.export_namespace(globals())
 light.clear()
-light.reset_exports()
+
+if 'POWERUP_AUTO_FLUSH' in os.environ:
+    light.set_auto_flush()
@@ -32,7 +32,7 @@ class KanoLightBoard(RectangularBoard):
     H_OFFSET = 55  # should be 60, to allow overflow
     V_OFFSET = 85  # should be 90, to allow overflow
 
-    def __init__(self, debug=True):
+    def __init__(self, debug=False):
         RectangularBoard.__init__(self)
 
         self._debug = debug
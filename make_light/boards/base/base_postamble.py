@@ -1,3 +1,6 @@
 
 # The blank line above is intentional, in case the user did not leave one at the
 # end of their code. Add any relevant jobs below, to be run after user code.
+
+# Send the last frame drawn in auto flush mode
+light.set_auto_flush(False)
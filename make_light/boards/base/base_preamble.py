@@ -15,6 +15,16 @@ if __name__ == '__main__' and __package__ is None:
         sys.path.insert(1, DIR_PATH)
 
 from make_light.boards.base.aliases import *
+from make_light.boards.base.sprite import Sprite
+from make_light.boards.base.timeline import Timeline
+from make_light.boards.base.board import install_flushing_sleep, \
+    install_final_flush
+
+# The boards in auto flush mode send their frames when the code sleeps, and
+# their last frame when it ends, even on an error
+install_flushing_sleep()
+install_final_flush()
+
 from time import *
 import time
 from datetime import datetime
@@ -6,11 +6,100 @@
 # Defines the structure of the Board class
 
 import os
+import time
+import atexit
+import inspect
+import numbers
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
 
 from make_light.boards.base.colours.colour_palette import ColourPalette
 from make_light.paths import BOARDS_BASE_DIR
 
 
+# Boards which send their frames when the user code sleeps, see
+# Board.set_auto_flush()
+_AUTO_FLUSH_BOARDS = weakref.WeakSet()
+_FINAL_FLUSH_INSTALLED = False
+
+
+def flush_boards():
+    """ Send the frames drawn on the boards in auto flush mode, except those
+    which are in a batch() block
+    """
+    for board in list(_AUTO_FLUSH_BOARDS):
+        if board._batch_depth == 1:
+            board.flush()
+
+
+def install_flushing_sleep():
+    """ Make time.sleep() send the frames of the boards in auto flush mode
+    before it sleeps. This must be done before the user code imports `sleep`
+    from the time module.
+    """
+    if getattr(time.sleep, 'flushes_boards', False):
+        return
+
+    original_sleep = time.sleep
+
+    def sleep(seconds):
+        flush_boards()
+        original_sleep(seconds)
+
+    sleep.flushes_boards = True
+    time.sleep = sleep
+
+
+def end_auto_flush():
+    """ End the auto flush mode of all the boards, which sends the last
+    frames they held back. This must be done when the user code ends, even if
+    it raised an error.
+    """
+    for board in list(_AUTO_FLUSH_BOARDS):
+        board.set_auto_flush(False)
+
+
+def install_final_flush():
+    """ End the auto flush mode of the boards when the interpreter exits, for
+    user code run as a script rather than by run_user_code()
+    """
+    global _FINAL_FLUSH_INSTALLED
+
+    if _FINAL_FLUSH_INSTALLED:
+        return
+
+    atexit.register(end_auto_flush)
+    _FINAL_FLUSH_INSTALLED = True
+
+
+def _shader_min(*args):
+    """ min() of the expressions given to fill(), which takes the smallest
+    value of its arguments, or of the items of a single argument, for each LED
+    """
+    if len(args) == 1:
+        args = list(args[0])
+
+    if not args:
+        raise ValueError('min() arg is an empty sequence')
+
+    return reduce(np.minimum, args)
+
+
+def _shader_max(*args):
+    """ max() of the expressions given to fill(), see _shader_min()
+    """
+    if len(args) == 1:
+        args = list(args[0])
+
+    if not args:
+        raise ValueError('max() arg is an empty sequence')
+
+    return reduce(np.maximum, args)
+
+
 class FeatureNotSupportedError(NotImplementedError):
     pass
 
@@ -22,6 +111,41 @@ class Board(ColourPalette):
     POSTAMBLE = None
     BOARD_DIR = None
 
+    # Number of batch() blocks the drawing is in, including the one of the
+    # auto flush mode
+    _batch_depth = 0
+    _auto_flush = False
+
+    # Names given to the user code, by board class, see get_namespace()
+    _NAMESPACES = {}
+
+    # Functions and constants of the expressions given to fill(), which work
+    # on arrays like their math module counterparts
+    _SHADER_NAMES = {
+        'np': np, 'pi': np.pi, 'e': np.e,
+        'sin': np.sin, 'cos': np.cos, 'tan': np.tan,
+        'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan,
+        'atan2': np.arctan2, 'hypot': np.hypot, 'sqrt': np.sqrt,
+        'exp': np.exp, 'log': np.log, 'log10': np.log10,
+        'floor': np.floor, 'ceil': np.ceil, 'abs': np.abs, 'fabs': np.abs,
+        'fmod': np.fmod, 'radians': np.radians, 'degrees': np.degrees,
+        'min': _shader_min, 'max': _shader_max, 'clip': np.clip,
+        'where': np.where,
+    }
+
+    # Expressions given to fill(), compiled, the most recently used last
+    _SHADERS = OrderedDict()
+    _MAX_SHADERS = 256
+
+    # Errors of functions given to fill() which only work on single numbers,
+    # e.g. using `if` or the math module on the coordinate arrays
+    _SCALAR_SHADER_ERRORS = (
+        'truth value of an array',
+        'arrays can be converted to Python scalars',
+    )
+
+    # Time of the first fill(), from which `t` is counted
+    _fill_start = None
 
     @property
     def base_preamble(self):
@@ -91,6 +215,102 @@ class Board(ColourPalette):
         except IOError:
             return self.base_postamble
 
+    def get_namespace(self):
+        """
+        Get the names this board gives to the user code: the LEDs, e.g. A1,
+        the colours, e.g. red, and helpers such as WIDTH. They are only worked
+        out once for each board class.
+
+        :returns: A new dict with the names, which can be modified
+        :rtype: dict
+        """
+        namespace = Board._NAMESPACES.get(self.__class__)
+
+        if namespace is None:
+            namespace = {}
+            namespace.update(self._get_named_colours())
+            namespace.update(self._get_coordinate_names())
+            namespace.update(self._get_global_helpers())
+
+            Board._NAMESPACES[self.__class__] = namespace
+
+        return dict(namespace)
+
+    def export_namespace(self, namespace):
+        """
+        Add the names of this board to the globals of the user code, see
+        get_namespace(). The names which are already defined are kept.
+
+        :param namespace: The globals of the user code
+        :type namespace: dict
+        """
+        for name, value in self.get_namespace().iteritems():
+            namespace.setdefault(name, value)
+
+    @contextmanager
+    def batch(self):
+        """
+        Draw several things as a single frame:
+
+            with light.batch():
+                light.all(False)
+                light.on(A1)
+
+        The LEDs are only updated once, when the outermost block ends.
+        """
+        self._enter_batch()
+        try:
+            yield self
+        finally:
+            self._exit_batch()
+
+    def set_auto_flush(self, enabled=True):
+        """
+        In auto flush mode, the drawing is only sent to the LEDs when the
+        user code sleeps, when flush() is called or when the mode ends, as if
+        the code between sleeps was in a batch() block.
+        """
+        if enabled == self._auto_flush:
+            return
+
+        self._auto_flush = enabled
+
+        if enabled:
+            _AUTO_FLUSH_BOARDS.add(self)
+            self._enter_batch()
+        else:
+            _AUTO_FLUSH_BOARDS.discard(self)
+            self._exit_batch()
+
+    def flush(self):
+        """
+        Send what was drawn so far in a batch() block or in auto flush mode
+        """
+        if self._batch_depth:
+            self._end_batch()
+            self._start_batch()
+
+    def _enter_batch(self):
+        if not self._batch_depth:
+            self._start_batch()
+
+        self._batch_depth += 1
+
+    def _exit_batch(self):
+        self._batch_depth -= 1
+
+        if not self._batch_depth:
+            self._end_batch()
+
+    def _start_batch(self):
+        pass
+
+    def _end_batch(self):
+        """
+        Send the frame drawn in the batch() block which just ended
+        """
+        pass
+
     def clear(self):
         raise NotImplementedError
 
@@ -132,3 +352,279 @@ class Board(ColourPalette):
 
     def spin(self, delay, **kwargs):
         raise FeatureNotSupportedError
+
+    def frame(self, buffer):
+        raise FeatureNotSupportedError
+
+    def fill(self, shader, t=None):
+        """
+        Light all the LEDs at once, with colours worked out for all of them
+        in one go from their coordinates, e.g.
+
+            light.fill(lambda x, y: (x / WIDTH, 0, y / HEIGHT))
+            light.fill('(sin(x + t) + 1) / 2')
+
+        The shader is either a function, called with the coordinates it takes
+        as arguments, or an expression using them. The coordinates are numpy
+        arrays with a value for each LED, in the order of `board`:
+            index: The number of the LED in `board`
+            x, y: The position of the LED
+            ring, led: The ring and the LED in it, on round boards
+            angle: The angle of the LED, in degrees, on round boards
+            strip, led: The strip and the LED in it, on boards of strips
+        along with the time `t`, which is the number of seconds since the
+        first fill(), unless it is given.
+
+        The shader gives either a colour, as (red, green, blue), or a
+        brightness for each LED. Fractions go from 0.0 to 1.0, while whole
+        numbers go from 0 to 255 for colours and from 0 to 7 for
+        brightnesses. A function which only works on the numbers of a single
+        LED, e.g. one using `if`, is called for each LED instead.
+        """
+        if t is None:
+            if self._fill_start is None:
+                self._fill_start = time.time()
+
+            t = time.time() - self._fill_start
+
+        coords = dict(self._get_shader_coords(), t=t)
+
+        if isinstance(shader, basestring):
+            with np.errstate(all='ignore'):
+                result = eval(
+                    self._compile_shader(shader), dict(self._SHADER_NAMES),
+                    self._copy_shader_args(coords)
+                )
+
+            self.frame(self._get_shader_colours(result))
+            return
+
+        args = self._get_shader_args(shader, coords)
+
+        try:
+            with np.errstate(all='ignore'):
+                result = shader(**self._copy_shader_args(args))
+        except (TypeError, ValueError) as exc:
+            if not any(
+                    error in str(exc) for error in self._SCALAR_SHADER_ERRORS):
+                raise
+
+            # The shader only works on the numbers of one LED
+            self.frame([
+                shader(**dict(
+                    (name, value[idx].item())
+                    if isinstance(value, np.ndarray) else (name, value)
+                    for name, value in args.iteritems()
+                ))
+                for idx in xrange(self.get_led_count())
+            ])
+            return
+
+        self.frame(self._get_shader_colours(result))
+
+    @staticmethod
+    def _compile_shader(expression):
+        """ Compile an expression given to fill(). The expressions used
+        recently are kept, so they are not compiled again.
+        """
+        cache = Board._SHADERS
+        code = cache.pop(expression, None)
+
+        if code is None:
+            code = compile(expression, '<fill>', 'eval')
+
+        cache[expression] = code
+        while len(cache) > Board._MAX_SHADERS:
+            cache.popitem(last=False)
+
+        return code
+
+    @staticmethod
+    def _get_shader_args(shader, coords):
+        """ Get the coordinates which a shader function takes
+        """
+        try:
+            spec = inspect.getargspec(
+                shader.__call__ if not inspect.isroutine(shader) else shader
+            )
+        except TypeError:
+            return coords
+
+        if spec.keywords:
+            return coords
+
+        return dict(
+            (name, value) for name, value in coords.iteritems()
+            if name in spec.args
+        )
+
+    @staticmethod
+    def _copy_shader_args(args):
+        """ Copy the coordinate arrays given to a shader, which it may change
+        in place, e.g. with `x += 1`
+        """
+        return dict(
+            (name, value.copy() if isinstance(value, np.ndarray) else value)
+            for name, value in args.iteritems()
+        )
+
+    def _get_shader_colours(self, result):
+        """
+        Get the colours of the LEDs from what a shader gave for all of them,
+        see fill()
+
+        :returns: An array of uint8 RGB colours, one row for each LED
+        :rtype: numpy.ndarray
+        :raises ValueError: if the result is not a colour or brightness for
+                            each LED
+        """
+        count = self.get_led_count()
+        error = ValueError(
+            'The shader must give a colour or a brightness for each of the '
+            '{} LEDs'.format(count)
+        )
+
+        try:
+            if isinstance(result, (tuple, list)) and len(result) == 3:
+                channels = [np.asarray(channel) for channel in result]
+
+                if all(channel.dtype.kind in 'biuf' for channel in channels):
+                    values = np.column_stack([
+                        np.broadcast_to(channel, (count,))
+                        for channel in channels
+                    ])
+                else:
+                    values = np.asarray(result)
+            else:
+                values = np.asarray(result)
+
+            if values.dtype.kind not in 'biuf':
+                raise error
+
+            values = np.nan_to_num(values)
+
+            if values.shape == (count, 3):
+                if values.dtype.kind == 'f':
+                    values = values * 255.
+
+                return np.clip(values, 0, 255).astype(np.uint8)
+
+            brightnesses = np.broadcast_to(values, (count,))
+        except ValueError:
+            raise error
+
+        if brightnesses.dtype.kind in 'iu':
+            brightnesses = np.clip(brightnesses, 0, 7)
+
+        return self._frame_brightnesses(brightnesses)
+
+    def blit(self, sprite, where, **kwargs):
+        raise FeatureNotSupportedError
+
+    def capture(self, A, B):
+        raise FeatureNotSupportedError
+
+    def _parse_sprite_colour(self, **kwargs):
+        """
+        Get the colour given to draw a whole sprite in, if any
+        """
+        colour = kwargs.get('colour', kwargs.get('color'))
+        if colour is None:
+            return None
+
+        return self._parse_colour_param(colour)
+
+    def _parse_frame(self, buffer):
+        """
+        Get the colours of all the LEDs from a frame, in the order of `board`.
+
+        The frame can be a list of colours or brightnesses, one for each LED,
+        or a nested list of them, e.g. by rows. Colours are given as for the
+        `colour` argument, brightnesses as True/False, a level from 0 to 7 or
+        a fraction from 0.0 to 1.0. Numpy arrays of colours or brightnesses
+        work the same, except that uint8 colours are used as they are, as
+        frames are kept by Timeline. Bytes or bytearrays hold either 3 values
+        (RGB) or a single brightness from 0 to 255 for each LED.
+
+        :returns: An array of uint8 RGB colours, one row for each LED
+        :rtype: numpy.ndarray
+        :raises ValueError: if the frame is not the size of the board
+        """
+        count = self.get_led_count()
+
+        if isinstance(buffer, (str, bytearray)):
+            values = np.frombuffer(bytes(buffer), dtype=np.uint8)
+
+            if values.size == count * 3:
+                return values.reshape(count, 3)
+            elif values.size == count:
+                return self._get_brightness_colours(values / 255.)
+        else:
+            try:
+                values = np.asarray(buffer)
+            except ValueError:
+                # Colours mixed with brightnesses
+                values = np.asarray(buffer, dtype=object)
+
+            is_colours = values.size == count * 3 and values.shape[-1] == 3
+
+            if values.dtype == np.uint8 and is_colours:
+                return values.reshape(count, 3)
+            elif values.dtype.kind in 'biuf':
+                if is_colours:
+                    return self._frame_colours(values.reshape(count, 3))
+                elif values.size == count:
+                    return self._frame_brightnesses(values.ravel())
+            else:
+                leds = list(self._flatten_frame(buffer))
+                if len(leds) == count:
+                    return np.array(
+                        [self._parse_frame_led(led) for led in leds],
+                        dtype=np.uint8
+                    )
+
+        raise ValueError(
+            'The frame must have a value for each of the {} LEDs'.format(count)
+        )
+
+    @staticmethod
+    def _frame_colours(values):
+        # Colours with all their channels up to 1 are normalised, as in
+        # _parse_colour_param()
+        values = values.astype(float)
+        normalised = values.max(axis=1) <= 1
+        values[normalised] *= 255.
+
+        return np.clip(values, 0, 255).astype(np.uint8)
+
+    def _frame_brightnesses(self, values):
+        if values.dtype.kind in 'iu':
+            values = values / 7.
+
+        return self._get_brightness_colours(values)
+
+    @classmethod
+    def _flatten_frame(cls, buffer):
+        for value in buffer:
+            if isinstance(value, (list, tuple)) and not cls._is_colour(value):
+                for led in cls._flatten_frame(value):
+                    yield led
+            else:
+                yield value
+
+    @staticmethod
+    def _is_colour(value):
+        return len(value) == 3 and all(
+            isinstance(channel, numbers.Number) for channel in value
+        )
+
+    def _parse_frame_led(self, value):
+        if isinstance(value, bool):
+            value = 1. if value else 0.
+        elif isinstance(value, numbers.Integral):
+            value = value / 7.
+
+        if isinstance(value, numbers.Number):
+            return self._get_brightness_colours(np.array([value]))[0]
+
+        return self._parse_colour_param(value)
@@ -0,0 +1,166 @@
+# code_thread.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A thread for the user code which can be stopped without ending the process
+
+import time
+import ctypes
+import threading
+
+
+_original_sleep = time.sleep
+_original_time = time.time
+
+
+class CodeCancelled(BaseException):
+    """ Raised in the user code when it is stopped.
+
+    It doesn't derive from Exception, so that an `except Exception` in the
+    user code doesn't keep it running.
+    """
+    pass
+
+
+def sleep(seconds):
+    """ Replacement of time.sleep() which returns early, with CodeCancelled,
+    when it is called from a CodeThread that gets cancelled
+    """
+    thread = threading.current_thread()
+    if isinstance(thread, CodeThread):
+        thread.sleep(seconds)
+    else:
+        _original_sleep(seconds)
+
+
+def virtual_time():
+    """ Replacement of time.time() which gives the time of the virtual clock
+    of the CodeThread it is called from, if it has one
+    """
+    thread = threading.current_thread()
+    if isinstance(thread, CodeThread) and thread.clock:
+        return thread.clock.now()
+
+    return _original_time()
+
+
+def install_cancellable_sleep():
+    """ Make time.sleep() cancellable in the code threads of this process.
+    This must be done before the user code is loaded, as it imports `sleep`
+    from the time module.
+    """
+    time.sleep = sleep
+
+
+def install_virtual_clock():
+    """ Make time.time() follow the virtual clocks of the code threads of this
+    process, see VirtualClock. Like install_cancellable_sleep(), this must be
+    done before the user code is loaded.
+    """
+    time.time = virtual_time
+
+
+class VirtualClock(object):
+    """ Clock of the user code, which only moves when it sleeps.
+
+    The user code doesn't really wait when it sleeps, but runs ahead of the
+    wall clock, by up to `look_ahead` seconds, so that the frames it draws
+    can be buffered and shown at the right time whatever the time it takes to
+    compute them. When the user code is slower than the animation it draws,
+    the clock is moved forward to the wall clock, as with real sleeps.
+    """
+
+    def __init__(self, look_ahead):
+        self.look_ahead = look_ahead
+        self.reset()
+
+    def reset(self):
+        """ Start the clock again from the wall clock time """
+        self._time = _original_time()
+
+    def now(self):
+        return self._time
+
+    def sleep(self, seconds, cancelled):
+        """ Move the clock forward, only blocking when it is too far ahead of
+        the wall clock
+
+        :param cancelled: Event set when the sleep should stop early
+        :type cancelled: threading.Event
+        :raises: CodeCancelled
+        """
+        self._time = max(self._time + max(0, seconds), _original_time())
+
+        ahead = self._time - _original_time() - self.look_ahead
+        if ahead > 0 and cancelled.wait(ahead):
+            raise CodeCancelled()
+
+
+class CodeThread(threading.Thread):
+    """ Thread running the user code, which stops it when cancel() is called.
+
+    The user code is stopped cooperatively, when it sleeps or updates the
+    board. If it does neither, e.g. in a loop doing only calculations,
+    CodeCancelled is raised asynchronously in the thread instead.
+
+    With a VirtualClock, the user code sleeps on the clock instead.
+    """
+
+    def __init__(self, target, args=(), clock=None):
+        threading.Thread.__init__(self, target=target, args=args)
+        self.daemon = True
+
+        self.clock = clock
+        self._cancelled = threading.Event()
+
+    @staticmethod
+    def check_current():
+        """ Raise CodeCancelled if called from a CodeThread being cancelled
+        :raises: CodeCancelled
+        """
+        thread = threading.current_thread()
+        if isinstance(thread, CodeThread):
+            thread.check_cancelled()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise CodeCancelled()
+
+    def sleep(self, seconds):
+        if self.clock:
+            self.check_cancelled()
+            self.clock.sleep(seconds, self._cancelled)
+        elif self._cancelled.wait(max(0, seconds)):
+            raise CodeCancelled()
+
+    def cancel(self, grace_period=0.1, timeout=1.0):
+        """ Stop the user code
+
+        :param grace_period: Seconds given to the user code to reach a sleep
+                             or a board update, before interrupting it
+        :type grace_period: float
+        :param timeout: Seconds to wait for the thread to end
+        :type timeout: float
+        :returns: Whether the thread has ended
+        :rtype: bool
+        """
+        self._cancelled.set()
+
+        self.join(grace_period)
+        if self.is_alive():
+            self._raise_cancelled()
+            self.join(max(0, timeout - grace_period))
+
+        return not self.is_alive()
+
+    def _raise_cancelled(self):
+        # This only takes effect when the thread runs Python code, a thread
+        # blocked in a system call is not interrupted
+        affected = ctypes.pythonapi.PyThreadState_SetAsyncExc(
+            ctypes.c_long(self.ident), ctypes.py_object(CodeCancelled)
+        )
+        if affected > 1:
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_long(self.ident), None
+            )
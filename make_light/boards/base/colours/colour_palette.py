@@ -5,18 +5,57 @@
 #
 # Module for abstracting colours for Make light scripts
 
-import sys
+from collections import OrderedDict
+
+import numpy as np
 from PIL import ImageColor
 
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+
 class ColourPalette(object):
     MONOCHROME = False
     HUE = None
 
-    def __init__(self):
-        self._export_named_colours()
+    # The colour of each lightness percentage, by hue, as tuples and as an
+    # array
+    _INTENSITY_COLOURS = {}
+    _BRIGHTNESS_COLOURS = {}
+
+    # Colours parsed from strings, the most recently used last
+    _PARSED_COLOURS = OrderedDict()
+    _MAX_PARSED_COLOURS = 256
 
     @staticmethod
     def get_colour_at_intensity(hue, intensity):
+        lightness = int(intensity)
+
+        if not 0 <= lightness <= 100:
+            return ColourPalette._get_hsl_colour(hue, lightness)
+
+        return ColourPalette._get_intensity_colours(hue)[lightness]
+
+    @staticmethod
+    def _get_intensity_colours(hue):
+        """
+        Get the colours of a hue at each lightness percentage, which are only
+        worked out the first time the hue is used.
+        """
+        key = int(hue) if hue else None
+        colours = ColourPalette._INTENSITY_COLOURS.get(key)
+
+        if colours is None:
+            colours = tuple(
+                ColourPalette._get_hsl_colour(hue, lightness)
+                for lightness in xrange(101)
+            )
+            ColourPalette._INTENSITY_COLOURS[key] = colours
+
+        return colours
+
+    @staticmethod
+    def _get_hsl_colour(hue, lightness):
         saturation = 100
 
         if not hue:
@@ -28,20 +67,58 @@ class ColourPalette(object):
             .format(
                 hue=int(hue),
                 saturation=saturation,
-                lightness=int(intensity)
+                lightness=lightness
             )
         )
 
     @staticmethod
-    def _inject_global_variables(name, val):
-        builtin = sys.modules['__builtin__'].__dict__
-        builtin[name] = val
+    def _get_rgb(colour):
+        """
+        Parse a colour string, e.g. 'red' or '#ff0000'. The colours used
+        recently are kept, so they are not parsed again.
+        """
+        cache = ColourPalette._PARSED_COLOURS
+        rgb = cache.pop(colour, None)
+
+        if rgb is None:
+            rgb = ImageColor.getrgb(colour)
+
+        cache[colour] = rgb
+        while len(cache) > ColourPalette._MAX_PARSED_COLOURS:
+            cache.popitem(last=False)
+
+        return rgb
+
+    @classmethod
+    def _get_brightness_colours(cls, brightnesses):
+        """
+        Get the colours of the LEDs at brightnesses from 0.0 to 1.0, as they
+        are lit by on() and all() with an intensity.
+
+        :param brightnesses: Array of brightnesses
+        :type brightnesses: numpy.ndarray
+        :returns: Array of uint8 RGB colours for the brightnesses
+        :rtype: numpy.ndarray
+        """
+        colours = ColourPalette._BRIGHTNESS_COLOURS.get(cls.HUE)
+        if colours is None:
+            colours = np.array(
+                cls._get_intensity_colours(cls.HUE), dtype=np.uint8
+            )
+            ColourPalette._BRIGHTNESS_COLOURS[cls.HUE] = colours
+
+        lightness = np.clip(np.asarray(brightnesses) * 100, 0, 100)
+
+        return colours[lightness.astype(int)]
 
     @staticmethod
     def normalise_colour(colour):
         return tuple(channel / 255. for channel in colour)
 
-    def _export_named_colours(self):
+    def _get_named_colours(self):
+        """ Get the colours given to the user code by name, e.g. red
+        """
+        colours = {}
         mode = 'L' if self.MONOCHROME else 'RGB'
 
         for col, col_val in ImageColor.colormap.iteritems():
@@ -55,14 +132,16 @@ class ColourPalette(object):
                     self.HUE, 100 * colour / 255.
                 )
 
-            self._inject_global_variables(col, colour)
+            colours[col] = colour
+
+        return colours
 
     @staticmethod
     def _parse_colour_param(colour_param):
-        default_colour = __builtins__['white']
+        default_colour = WHITE
 
         if type(colour_param) == str:
-            return ImageColor.getrgb(colour_param)
+            return ColourPalette._get_rgb(colour_param)
 
         if not (type(colour_param) == tuple or type(colour_param) == list):
             return default_colour
@@ -86,9 +165,9 @@ class ColourPalette(object):
         on = kwargs.get('on', True)
 
         if not on:
-            return __builtins__['black']
+            return BLACK
 
-        colour = __builtins__['white']
+        colour = WHITE
 
         if 'colour' in kwargs:
             colour = cls._parse_colour_param(kwargs['colour'])
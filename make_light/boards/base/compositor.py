@@ -0,0 +1,400 @@
+# compositor.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Composes the simulated LEDs onto the board image incrementally
+
+import threading
+from itertools import izip
+
+from PIL import Image, ImageChops
+
+
+def _nearest_span_map(src_size, dst_size):
+    """
+    Work out which destination pixels each source pixel is scaled to when
+    resizing with Image.NEAREST.
+
+    The mapping is computed by PIL itself so that it matches `resize` exactly.
+
+    Returns:
+        A list with a (start, end) tuple of destination pixels for every source
+        pixel. The span is empty when the source pixel is scaled out.
+    """
+    strip = Image.new('I', (src_size, 1))
+    strip.putdata(range(src_size))
+    src_of_dst = list(strip.resize((dst_size, 1), Image.NEAREST).getdata())
+
+    spans = []
+    dst = 0
+    for src in xrange(src_size):
+        start = dst
+        while dst < dst_size and src_of_dst[dst] == src:
+            dst += 1
+        spans.append((start, dst))
+
+    return spans
+
+
+def _brightness_lut(value):
+    """
+    Build the lookup table which clips an LED of brightness `value` to the
+    board mask, using PIL's own blending so that rounding is unchanged.
+    """
+    ramp = Image.new('L', (256, 1))
+    ramp.putdata(range(256))
+
+    lut = Image.new('L', (256, 1))
+    lut.paste(value, None, mask=ramp)
+
+    return list(lut.getdata())
+
+
+class SpriteCache(object):
+    """
+    The LED sprites of a board drawn at one size.
+
+    Each LED shape cut out of the board mask is kept once, along with the mask
+    of its glow at every brightness level used so far. The cache is shared by
+    the compositors of a board at that size, so the sprites are only built the
+    first time a level is drawn.
+    """
+
+    def __init__(self):
+        self._shape_ids = {}
+        self._shapes = []
+        self._sprites = {}
+        self._lock = threading.Lock()
+
+    def add_shape(self, mask):
+        """
+        Get the id of an LED shape, adding it to the cache if it is new.
+
+        Args:
+            mask: A PIL.Image.new object in 'L' mode with the shape of the LED.
+
+        Returns:
+            The id of the shape, to be given to get_sprite().
+        """
+        key = (mask.size, mask.tobytes())
+
+        with self._lock:
+            shape_id = self._shape_ids.get(key)
+            if shape_id is None:
+                shape_id = self._shape_ids[key] = len(self._shapes)
+                self._shapes.append(mask)
+
+        return shape_id
+
+    def get_sprite(self, shape_id, brightness):
+        """
+        Get the mask of an LED shape lit at a brightness level, which is the
+        shape clipped to the brightness.
+        """
+        key = (shape_id, brightness)
+        sprite = self._sprites.get(key)
+
+        if sprite is None:
+            sprite = self._shapes[shape_id].point(_brightness_lut(brightness))
+            self._sprites[key] = sprite
+
+        return sprite
+
+
+class BoardCompositor(object):
+    """
+    Draws the LEDs image of a simulation board on top of the board image.
+
+    The board image and mask are prepared once and only the LEDs which changed
+    since the previous frame are blended again. The result is the same as
+    scaling up the LEDs image with Image.NEAREST, clipping its brightness to
+    the board mask and pasting it onto the board image.
+
+    When the LEDs image is a grid of LEDs scaled up onto the board, every LED
+    gets an entry in the atlas: its box on the board, the board background
+    behind it and the shape of its sprites in the SpriteCache. Otherwise the
+    LEDs image is a canvas and the bounding box of the changes is composed
+    instead.
+
+    The board image and mask can be of any size, the LEDs are scaled to them
+    with the same mapping for every frame.
+    """
+
+    # Largest LEDs image which is treated as a grid of LEDs
+    MAX_ATLAS_LEDS = 1024
+
+    def __init__(self, board_image, board_mask, offset, layer_size,
+                 sprite_cache=None):
+        # The board image is kept as RGBA so that frames can be handed to Gdk
+        # without converting them
+        if board_image.mode != 'RGBA':
+            board_image = board_image.convert('RGBA')
+
+        self._board_image = board_image
+        self._board_mask = board_mask
+        self._offset = offset
+        self._layer_size = layer_size
+        self._bands = len(board_image.getbands())
+
+        self._sprite_cache = sprite_cache or SpriteCache()
+
+        self._leds_size = None
+        self._lock = threading.Lock()
+
+    def _setup(self, leds_size):
+        """
+        Prepare the mapping from the LEDs image onto the board image. This is
+        only redone if the size of the LEDs image changes.
+        """
+        layer_size = self._layer_size
+
+        self._leds_size = leds_size
+        self._col_spans = _nearest_span_map(leds_size[0], layer_size[0])
+        self._row_spans = _nearest_span_map(leds_size[1], layer_size[1])
+
+        self._per_led = (
+            leds_size[0] <= layer_size[0] and leds_size[1] <= layer_size[1] and
+            leds_size[0] * leds_size[1] <= self.MAX_ATLAS_LEDS
+        )
+
+        if self._per_led:
+            self._build_atlas()
+
+        self._composite = self._board_image.copy()
+        self._last_leds = None
+
+    def _build_atlas(self):
+        h_offset, v_offset = self._offset
+        self._boxes = []
+        self._backgrounds = []
+        self._shapes = []
+
+        for row_start, row_end in self._row_spans:
+            for col_start, col_end in self._col_spans:
+                box = (
+                    col_start + h_offset, row_start + v_offset,
+                    col_end + h_offset, row_end + v_offset
+                )
+                self._boxes.append(box)
+                self._backgrounds.append(self._board_image.crop(box))
+                self._shapes.append(self._sprite_cache.add_shape(
+                    self._board_mask.crop(
+                        (col_start, row_start, col_end, row_end)
+                    )
+                ))
+
+    def compose(self, im, changed_box=None):
+        """
+        Get the board image with the LEDs drawn on it.
+
+        Args:
+            im: A PIL.Image.new object with the LEDs to draw.
+            changed_box: See update()
+
+        Returns:
+            A new PIL.Image.new object with the LEDs drawn on the board image.
+        """
+        with self._lock:
+            self._update(im, changed_box)
+
+            return self._composite.copy()
+
+    def compose_bytes(self, im, changed_box=None):
+        """
+        Same as compose(), but get the raw RGBA pixels of the board image
+        instead, avoiding an intermediate copy of the image.
+
+        Returns:
+            A tuple with the pixels as a string and the size of the image.
+        """
+        with self._lock:
+            self._update(im, changed_box)
+
+            return self._composite.tobytes(), self._composite.size
+
+    def update(self, im, changed_box=None):
+        """
+        Draw the changes in the LEDs image on the board image.
+
+        Args:
+            im: A PIL.Image.new object with the LEDs to draw.
+            changed_box: The (left, top, right, bottom) box of the LEDs image
+                         which changed since the previous frame given to this
+                         compositor. When it is None, the whole LEDs image is
+                         compared to the previous frame.
+
+        Returns:
+            The (left, top, right, bottom) box of the board image which was
+            drawn again or None when nothing changed.
+        """
+        with self._lock:
+            return self._update(im, changed_box)
+
+    def get_bytes(self, box=None):
+        """
+        Get the raw RGBA pixels of the board image with the LEDs drawn on it.
+
+        Args:
+            box: The (left, top, right, bottom) region to get, defaults to the
+                 whole board image.
+
+        Returns:
+            A tuple with the pixels as a string and the size of the region.
+        """
+        with self._lock:
+            image = self._composite.crop(box) if box else self._composite
+
+            return image.tobytes(), image.size
+
+    def _update(self, im, changed_box):
+        if im.size != self._leds_size:
+            self._setup(im.size)
+            changed_box = None
+
+        if self._last_leds is None:
+            changed_box = (0, 0) + self._leds_size
+        elif changed_box is None:
+            changed_box = self._find_changed_box(im)
+        else:
+            changed_box = self._clip_box(changed_box)
+
+        if not changed_box:
+            return None
+
+        if self._per_led:
+            return self._compose_leds(im, changed_box)
+
+        return self._compose_canvas(im, changed_box)
+
+    def _clip_box(self, box):
+        width, height = self._leds_size
+        left, top, right, bottom = box
+
+        box = (
+            max(0, left), max(0, top), min(width, right), min(height, bottom)
+        )
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return None
+
+        return box
+
+    def _find_changed_box(self, im):
+        if self._per_led:
+            width = self._leds_size[0]
+            changed = [
+                idx for idx, (old, new)
+                in enumerate(izip(self._last_leds, im.getdata()))
+                if old != new
+            ]
+            if not changed:
+                return None
+
+            cols = [idx % width for idx in changed]
+            return (
+                min(cols), changed[0] / width,
+                max(cols) + 1, changed[-1] / width + 1
+            )
+
+        return ImageChops.difference(self._last_leds, im).getbbox()
+
+    def _to_board_box(self, box):
+        left, top, right, bottom = box
+        h_offset, v_offset = self._offset
+
+        return (
+            self._col_spans[left][0] + h_offset,
+            self._row_spans[top][0] + v_offset,
+            self._col_spans[right - 1][1] + h_offset,
+            self._row_spans[bottom - 1][1] + v_offset
+        )
+
+    def _compose_leds(self, im, changed_box):
+        left, top, right, bottom = changed_box
+        width = self._leds_size[0]
+        last_leds = self._last_leds
+        pixels = im.load()
+
+        if last_leds is None:
+            last_leds = self._last_leds = [None] * (width * self._leds_size[1])
+
+        redrawn = []
+        for y in xrange(top, bottom):
+            for x in xrange(left, right):
+                idx = y * width + x
+                colour = pixels[x, y]
+                if colour != last_leds[idx]:
+                    last_leds[idx] = colour
+                    self._blend_led(idx, colour)
+                    redrawn.append(self._boxes[idx])
+
+        if not redrawn:
+            return None
+
+        return (
+            min(box[0] for box in redrawn), min(box[1] for box in redrawn),
+            max(box[2] for box in redrawn), max(box[3] for box in redrawn)
+        )
+
+    def _blend_led(self, idx, colour):
+        box = self._boxes[idx]
+        if box[0] == box[2] or box[1] == box[3]:
+            return
+
+        self._composite.paste(self._backgrounds[idx], box)
+
+        # The brightness of an LED is the value component of its HSV colour
+        brightness = max(colour[:3])
+        if not brightness:
+            return
+
+        led_mask = self._sprite_cache.get_sprite(self._shapes[idx], brightness)
+        self._composite.paste(colour[:self._bands], box, mask=led_mask)
+
+    def _compose_canvas(self, im, changed_box):
+        if self._last_leds is None:
+            self._last_leds = im.copy()
+        else:
+            self._last_leds.paste(im.crop(changed_box), changed_box)
+
+        board_box = self._to_board_box(changed_box)
+        if board_box[0] == board_box[2] or board_box[1] == board_box[3]:
+            return None
+
+        h_offset, v_offset = self._offset
+        layer_box = (
+            board_box[0] - h_offset, board_box[1] - v_offset,
+            board_box[2] - h_offset, board_box[3] - v_offset
+        )
+
+        leds_layer = self._scale_region(im, layer_box)
+
+        # Create LED luminosity alpha mask, clipped to the LED shapes
+        led_brightness_mask = leds_layer.convert('HSV').split()[2]
+        led_mask = Image.new('L', leds_layer.size)
+        led_mask.paste(led_brightness_mask, None,
+                       mask=self._board_mask.crop(layer_box))
+
+        self._composite.paste(self._board_image.crop(board_box), board_box)
+        self._composite.paste(leds_layer, board_box, mask=led_mask)
+
+        return board_box
+
+    def _scale_region(self, im, layer_box):
+        """
+        Scale up the region of the LEDs image which is drawn in `layer_box` of
+        the LEDs layer, the same as cropping the whole image scaled up.
+        """
+        x_scale = float(im.size[0]) / self._layer_size[0]
+        y_scale = float(im.size[1]) / self._layer_size[1]
+        source_box = (
+            layer_box[0] * x_scale, layer_box[1] * y_scale,
+            layer_box[2] * x_scale, layer_box[3] * y_scale
+        )
+        size = (layer_box[2] - layer_box[0], layer_box[3] - layer_box[1])
+
+        try:
+            return im.resize(size, Image.NEAREST, box=source_box)
+        except TypeError:
+            # Pillow before 4.3 can only scale the whole image
+            return im.resize(self._layer_size, Image.NEAREST).crop(layer_box)
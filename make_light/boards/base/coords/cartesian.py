@@ -5,9 +5,10 @@
 #
 # Implements methods for cartesian coordinates
 
-import itertools
+import numpy as np
 
 from make_light.boards.base.coords.coords import Coords
+from make_light.boards.base.coords.leds import LedGrid
 
 
 class Cartesian(Coords):
@@ -23,6 +24,8 @@ class Cartesian(Coords):
         self._h_offset = h_offset
         self._v_offset = v_offset
 
+        self.leds = LedGrid.get(h_led_count, v_led_count)
+
         super(Cartesian, self).__init__()
 
     def get_coords(self, addr):
@@ -32,6 +35,9 @@ class Cartesian(Coords):
             self._v_led_spacing * v_led_idx + self._v_offset,
         )
 
+    def get_led_count(self):
+        return self._h_led_count * self._v_led_count
+
     def get_bounding_box(self, addr):
         x, y = self.get_coords(addr)
         h_range = self._h_led_spacing / 2
@@ -56,48 +62,37 @@ class Cartesian(Coords):
             )
         }
 
-    def _generate_coordinates(self):
-        for x in xrange(self._h_led_count):
-            for y in xrange(self._v_led_count):
-                name = chr(ord('A') + x) + str(y + 1)
-                self._inject_global_variables(name, (x, y))
-
-                name = chr(ord('a') + x) + str(y + 1)
-                self._inject_global_variables(name, (x, y))
+    def _build_shader_coords(self):
+        coords = Coords._build_shader_coords(self)
+        coords['x'], coords['y'] = np.array(self.leds, dtype=float).T
 
-    def _generate_global_helpers(self):
-        self._inject_global_variables('LIGHT_WIDTH', 0)
-        self._inject_global_variables('LIGHT_HEIGHT', 0)
+        return coords
 
-        self._inject_global_variables('WIDTH', self._h_led_count)
-        self._inject_global_variables('HEIGHT', self._v_led_count)
-
-        self._inject_global_variables(
-            'SIZE', (self._h_led_count, self._v_led_count)
-        )
+    def _get_coordinate_names(self):
+        names = {}
 
-        self._inject_global_variables('TOPLEFT', (0, 0))
-        self._inject_global_variables('TOPRIGHT', (self._h_led_count, 0))
-        self._inject_global_variables('BOTTOMLEFT', (0, self._v_led_count))
-        self._inject_global_variables('BOTTOMRIGHT', __builtins__['SIZE'])
+        for x, y in self.leds:
+            names[chr(ord('A') + x) + str(y + 1)] = (x, y)
+            names[chr(ord('a') + x) + str(y + 1)] = (x, y)
 
-        self.reset_exports()
+        return names
 
-    def _row_iter(self, loop=False):
-        def row(row_no):
-            for i in xrange(self._h_led_count):
-                yield tuple((i, row_no))
+    def _get_global_helpers(self):
+        helpers = Coords._get_global_helpers(self)
+        size = (self._h_led_count, self._v_led_count)
 
-        def all_rows():
-            for row_no in xrange(self._v_led_count):
-                for i in row(row_no):
-                    yield i
+        helpers.update({
+            'LIGHT_WIDTH': 0,
+            'LIGHT_HEIGHT': 0,
 
-        if loop:
-            return itertools.cycle(all_rows())
+            'WIDTH': self._h_led_count,
+            'HEIGHT': self._v_led_count,
+            'SIZE': size,
 
-        return all_rows()
+            'TOPLEFT': (0, 0),
+            'TOPRIGHT': (self._h_led_count, 0),
+            'BOTTOMLEFT': (0, self._v_led_count),
+            'BOTTOMRIGHT': size,
+        })
 
-    def reset_exports(self):
-        self._inject_global_variables('board', self._row_iter())
-        self._inject_global_variables('board_loop', self._row_iter(loop=True))
+        return helpers
@@ -6,14 +6,19 @@
 # Module that defines the structure of the coordinate Class
 
 import math
-import sys
+
+import numpy as np
+
 
 class Coords(object):
+    # Addresses of all the LEDs of the board, see LedSequence
+    leds = ()
+
+    # Coordinates given to the shaders of fill(), see _get_shader_coords()
+    _shader_coords = None
 
     def __init__(self):
         super(Coords, self).__init__()
-        self._generate_coordinates()
-        self._generate_global_helpers()
 
     def get_coords(self, addr):
         raise NotImplementedError
@@ -21,15 +26,39 @@ class Coords(object):
     def get_bounding_box(self, addr):
         raise NotImplementedError
 
-    def _generate_coordinates(self):
+    def get_led_count(self):
         raise NotImplementedError
 
-    def _generate_global_helpers(self):
+    def _get_coordinate_names(self):
+        """ Get the names of the LEDs given to the user code, e.g. A1
+        """
         raise NotImplementedError
 
+    def _get_shader_coords(self):
+        """ Get the coordinates of the LEDs given to the shaders of fill(),
+        as arrays in the order of `leds`. They are only worked out once, and
+        are read-only so that no shader can change them for the next ones.
+        """
+        if self._shader_coords is None:
+            coords = self._build_shader_coords()
+            for values in coords.itervalues():
+                values.flags.writeable = False
+
+            self._shader_coords = coords
+
+        return self._shader_coords
+
+    def _build_shader_coords(self):
+        return {'index': np.arange(len(self.leds))}
+
+    def _get_global_helpers(self):
+        """ Get the helper constants given to the user code
+        """
+        return {'board_loop': self.leds.loop()}
+
     @staticmethod
     def is_pos(pos):
-        return type(pos) == tuple or pos == __builtins__['all']
+        return type(pos) == tuple or pos == all
 
     @staticmethod
     def polar_to_cartesian(r, theta):
@@ -38,26 +67,21 @@ class Coords(object):
             r * math.sin(math.pi * theta / 180)
         )
 
-    @staticmethod
-    def _inject_global_variables(name, val):
-        builtin = sys.modules['__builtin__'].__dict__
-        builtin[name] = val
-
     @staticmethod
     def _is_pos(pos):
-        return type(pos) == tuple or pos == __builtins__['all']
+        return type(pos) == tuple or pos == all
 
-    @classmethod
-    def _parse_coord_args(cls, *args):
+    def _parse_coord_args(self, *args):
         intensity = 7
         leds = args
 
         # if last argument is not a coordinate, treat as a color spec
-        if len(args) and not cls.is_pos(args[-1]):
+        if len(args) and not self.is_pos(args[-1]):
             intensity = args[-1]
             leds = args[:-1]
 
-        if len(args) and args[0] == __builtins__['all']:
-            leds = [led for led in __builtins__['board']]
+        if len(args) and args[0] == all:
+            # All the LEDs of the board, see LedSequence
+            leds = self.leds
 
         return leds, intensity
@@ -0,0 +1,292 @@
+# layout.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Implements methods for LEDs placed anywhere, e.g. strips and panels
+
+import json
+import math
+
+import numpy as np
+
+from make_light.boards.base.coords.coords import Coords
+from make_light.boards.base.coords.leds import LedStrips
+
+
+class LedIndex(object):
+    """
+    Spatial index of the (x, y) positions of LEDs, which finds the LEDs
+    covered by a shape without going through all of them.
+
+    The LEDs are put in buckets of a grid of square cells. A shape only looks
+    at the LEDs in the cells it overlaps and then tests their exact positions,
+    all at once with numpy.
+
+    The queries return arrays of the indices of the LEDs in `positions`.
+    """
+
+    def __init__(self, positions, cell_size=None):
+        """
+        :param positions: The (x, y) position of each LED
+        :type positions: list or numpy.ndarray
+        :param cell_size: Width of the cells of the grid, defaults to about
+                          one LED per cell
+        :type cell_size: float
+        """
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.cell_size = float(cell_size or self._get_cell_size())
+
+        cells = np.floor(self.positions / self.cell_size).astype(int)
+        buckets = {}
+        for idx, cell in enumerate(cells.tolist()):
+            buckets.setdefault(tuple(cell), []).append(idx)
+
+        self._buckets = dict(
+            (cell, np.array(leds)) for cell, leds in buckets.iteritems()
+        )
+
+    def _get_cell_size(self):
+        if len(self.positions) < 2:
+            return 1.
+
+        width, height = self.positions.ptp(axis=0)
+        area = max(width, 1.) * max(height, 1.)
+
+        return math.sqrt(area / len(self.positions))
+
+    def _get_cell(self, x, y):
+        return (
+            int(math.floor(x / self.cell_size)),
+            int(math.floor(y / self.cell_size))
+        )
+
+    def _get_bucket_leds(self, cells):
+        buckets = [
+            self._buckets[cell] for cell in cells if cell in self._buckets
+        ]
+        if not buckets:
+            return np.zeros(0, dtype=int)
+
+        return np.concatenate(buckets)
+
+    def _get_candidates(self, box):
+        """ Get the LEDs in the cells overlapping a (left, top, right, bottom)
+        box, which may be outside of it
+        """
+        left, top = self._get_cell(box[0], box[1])
+        right, bottom = self._get_cell(box[2], box[3])
+
+        # Large boxes only look at the cells which hold LEDs
+        if (right - left + 1) * (bottom - top + 1) > len(self._buckets):
+            cells = [
+                (x, y) for x, y in self._buckets
+                if left <= x <= right and top <= y <= bottom
+            ]
+        else:
+            cells = [
+                (x, y)
+                for y in xrange(top, bottom + 1)
+                for x in xrange(left, right + 1)
+            ]
+
+        return self._get_bucket_leds(cells)
+
+    def in_box(self, box):
+        """ Get the LEDs within a (left, top, right, bottom) box, edges
+        included
+        """
+        leds = self._get_candidates(box)
+        x_vals, y_vals = self.positions[leds].T
+
+        return leds[
+            (x_vals >= box[0]) & (x_vals <= box[2]) &
+            (y_vals >= box[1]) & (y_vals <= box[3])
+        ]
+
+    def in_ellipse(self, box):
+        """ Get the LEDs within the ellipse fitting a (left, top, right,
+        bottom) box
+        """
+        leds = self._get_candidates(box)
+        centre = ((box[0] + box[2]) / 2., (box[1] + box[3]) / 2.)
+        radii = (
+            max((box[2] - box[0]) / 2., 1e-9),
+            max((box[3] - box[1]) / 2., 1e-9)
+        )
+
+        offsets = (self.positions[leds] - centre) / radii
+
+        return leds[(offsets ** 2).sum(axis=1) <= 1]
+
+    def in_circle(self, centre, radius):
+        """ Get the LEDs within a distance of a point
+        """
+        x, y = centre
+
+        return self.in_ellipse(
+            (x - radius, y - radius, x + radius, y + radius)
+        )
+
+    def near_segment(self, start, end, distance):
+        """ Get the LEDs within a distance of the line from start to end
+        """
+        start = np.asarray(start, dtype=float)
+        end = np.asarray(end, dtype=float)
+        direction = end - start
+        length = math.hypot(*direction)
+
+        # Walk along the line, a cell at a time, and take the cells around it.
+        # Every point of the line is within half a cell of a step.
+        steps = int(length / self.cell_size) + 1
+        reach = int(math.ceil(distance / self.cell_size + 0.5))
+        points = start + np.outer(np.linspace(0, 1, steps + 1), direction)
+
+        around = np.arange(-reach, reach + 1)
+        around = np.dstack(np.meshgrid(around, around)).reshape(-1, 2)
+        cells = np.floor(points / self.cell_size).astype(int)
+        cells = (cells[:, np.newaxis] + around).reshape(-1, 2)
+
+        leds = self._get_bucket_leds(set(map(tuple, cells.tolist())))
+        offsets = self.positions[leds] - start
+
+        if length:
+            along = np.clip(offsets.dot(direction) / length ** 2, 0, 1)
+            offsets = offsets - np.outer(along, direction)
+
+        return leds[(offsets ** 2).sum(axis=1) <= distance ** 2]
+
+    def in_polygon(self, points):
+        """ Get the LEDs within a polygon, by the even-odd rule
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if not len(points):
+            return np.zeros(0, dtype=int)
+
+        box = tuple(points.min(axis=0)) + tuple(points.max(axis=0))
+        leds = self.in_box(box)
+        x_vals, y_vals = self.positions[leds].T
+
+        inside = np.zeros(len(leds), dtype=bool)
+        for (x1, y1), (x2, y2) in zip(points, np.roll(points, -1, axis=0)):
+            if y1 == y2:
+                continue
+
+            # Toggle the LEDs with the edge crossing the ray going right
+            crosses = (y1 > y_vals) != (y2 > y_vals)
+            edge_x = x1 + (y_vals - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (x_vals < edge_x)
+
+        return leds[inside]
+
+
+class Layout(Coords):
+    """
+    LEDs placed anywhere, given by their (x, y) positions. The LEDs are in
+    strips, and are addressed by (strip, led) as the rings of Polar are.
+    """
+
+    def __init__(self, strips, led_radius=0):
+        """
+        :param strips: The (x, y) positions of the LEDs of each strip
+        :type strips: list
+        :param led_radius: The radius of the LEDs, within which lines light
+                           them
+        :type led_radius: float
+        """
+        self._strips = [
+            np.asarray(strip, dtype=float).reshape(-1, 2) for strip in strips
+        ]
+        self._led_radius = led_radius
+
+        self.leds = LedStrips.get([len(strip) for strip in self._strips])
+
+        # Index of the first LED of each strip, in the order of self.leds
+        self._strip_starts = np.cumsum(
+            [0] + [len(strip) for strip in self._strips]
+        )[:-1].tolist()
+
+        if self._strips:
+            positions = np.concatenate(self._strips)
+        else:
+            positions = np.zeros((0, 2))
+        self._led_index = LedIndex(positions)
+
+        super(Layout, self).__init__()
+
+    @staticmethod
+    def load_strips(path):
+        """
+        Load the positions of the LEDs from a JSON file, e.g.
+
+            {"strips": [[[10, 10], [20, 10]], [[10, 30], [25, 35]]]}
+
+        The file can also hold the list of strips alone, or the positions of
+        the LEDs of a single strip.
+        """
+        with open(path) as layout_file:
+            strips = json.load(layout_file)
+
+        if isinstance(strips, dict):
+            strips = strips['strips']
+
+        if strips and strips[0] and not isinstance(strips[0][0], list):
+            strips = [strips]
+
+        return strips
+
+    def get_coords(self, addr):
+        strip, led_idx = addr
+        return tuple(self._strips[strip][led_idx])
+
+    def get_led_count(self):
+        return len(self.leds)
+
+    def get_bounding_box(self, addr):
+        x, y = self.get_coords(addr)
+        radius = self._led_radius
+
+        return (
+            (x - radius, y - radius),
+            (x + radius, y + radius)
+        )
+
+    def _get_led_index(self, addr):
+        """ Get the position of an LED in the order of self.leds
+        """
+        strip, led_idx = addr
+        return self._strip_starts[strip] + led_idx % len(self._strips[strip])
+
+    def _build_shader_coords(self):
+        coords = Coords._build_shader_coords(self)
+        coords['strip'], coords['led'] = np.array(
+            self.leds, dtype=float
+        ).reshape(-1, 2).T
+        coords['x'], coords['y'] = self._led_index.positions.T
+
+        return coords
+
+    @staticmethod
+    def _get_strip_name(strip_no):
+        """ Get the letters of a strip, A to Z then AA, AB and so on, as
+        the columns of a spreadsheet
+        """
+        name = ''
+        strip_no += 1
+
+        while strip_no:
+            strip_no, letter = divmod(strip_no - 1, 26)
+            name = chr(ord('A') + letter) + name
+
+        return name
+
+    def _get_coordinate_names(self):
+        names = {}
+
+        for addr in self.leds:
+            strip_no, led_no = addr
+            name = self._get_strip_name(strip_no) + str(led_no + 1)
+            names[name] = addr
+            names[name.lower()] = addr
+
+        return names
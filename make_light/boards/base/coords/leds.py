@@ -0,0 +1,120 @@
+# leds.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Collections of the addresses of the LEDs of a board
+
+import itertools
+
+
+class LedSequence(tuple):
+    """
+    The addresses of some LEDs, in order. Unlike a generator, it can be
+    iterated over any number of times.
+    """
+
+    def loop(self):
+        """ Get an iterable which goes over the LEDs again and again
+        """
+        return LedLoop(self)
+
+
+class LedLoop(object):
+    """
+    Iterable going over a sequence of LEDs forever. Each loop over it starts
+    again from the first LED.
+    """
+
+    def __init__(self, leds):
+        self.leds = leds
+
+    def __iter__(self):
+        return itertools.cycle(self.leds)
+
+
+class LedGrid(LedSequence):
+    """
+    The (x, y) addresses of the LEDs of a grid, row by row. Grids are built
+    once for each size, see get().
+    """
+    _GRIDS = {}
+
+    @staticmethod
+    def get(width, height):
+        """ Get the (shared) grid of the given size
+        """
+        key = (width, height)
+        if key not in LedGrid._GRIDS:
+            LedGrid._GRIDS[key] = LedGrid(width, height)
+
+        return LedGrid._GRIDS[key]
+
+    def __new__(cls, width, height):
+        grid = LedSequence.__new__(
+            cls, ((x, y) for y in xrange(height) for x in xrange(width))
+        )
+        grid.width = width
+        grid.height = height
+
+        grid.rows = tuple(
+            LedSequence(grid[y * width:(y + 1) * width])
+            for y in xrange(height)
+        )
+        grid.columns = tuple(
+            LedSequence(grid[x::width]) for x in xrange(width)
+        )
+
+        return grid
+
+    def row(self, y):
+        return self.rows[y]
+
+    def column(self, x):
+        return self.columns[x]
+
+
+class LedRings(LedSequence):
+    """
+    The (ring, led) addresses of the LEDs of concentric rings, ring by ring.
+    Rings are built once for each number of LEDs per ring, see get().
+    """
+    _RINGS = {}
+
+    @classmethod
+    def get(cls, led_counts):
+        """ Get the (shared) rings with the given numbers of LEDs
+        """
+        key = (cls, tuple(led_counts))
+        if key not in LedRings._RINGS:
+            LedRings._RINGS[key] = cls(key[1])
+
+        return LedRings._RINGS[key]
+
+    def __new__(cls, led_counts):
+        rings = tuple(
+            LedSequence((ring_no, led_no) for led_no in xrange(led_count))
+            for ring_no, led_count in enumerate(led_counts)
+        )
+
+        leds = LedSequence.__new__(cls, itertools.chain(*rings))
+        leds.rings = rings
+
+        return leds
+
+    def ring(self, ring_no):
+        return self.rings[ring_no]
+
+
+class LedStrips(LedRings):
+    """
+    The (strip, led) addresses of the LEDs of strips, strip by strip. They
+    are numbered the same way as rings.
+    """
+
+    @property
+    def strips(self):
+        return self.rings
+
+    def strip(self, strip_no):
+        return self.rings[strip_no]
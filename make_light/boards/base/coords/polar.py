@@ -5,59 +5,116 @@
 #
 # Implements methods for polar coordinates
 
-import itertools
+import numpy as np
 
 from make_light.boards.base.coords.coords import Coords
+from make_light.boards.base.coords.leds import LedRings
 
 
 class Ring(object):
+    """
+    A ring of LEDs spread evenly around a circle, the first one at `offset`
+    degrees. Each LED lights the sector of the ring around its angle.
+
+    The geometry of the LEDs is worked out once, in tables indexed by LED:
+        angles:  The angle of the middle of each LED
+        sectors: The (start, end) angles of each LED's sector
+        boxes:   The (min x, min y, max x, max y) corners of each sector
+    along with the LED lit at each angle, so drawing by angle or by LED is a
+    lookup rather than trigonometry.
+    """
+
+    # Number of angle buckets per degree in the angle to LED table
+    ANGLE_RESOLUTION = 4
 
     def __init__(self, led_count, radius, thickness, offset):
         self.led_count = led_count
-        self._angular_spacing = 360 / self.led_count
+        self._angular_spacing = 360. / self.led_count
         self.radius = radius
         self._thickness = thickness
         self._offset = offset
 
+        leds = np.arange(led_count)
+        self.angles = leds * self._angular_spacing + offset
+        self.sectors = np.column_stack((
+            self.angles - self._angular_spacing / 2,
+            self.angles + self._angular_spacing / 2
+        ))
+        self.boxes = self._get_sector_boxes()
+
+        # The LED whose sector holds the middle of each bucket
+        buckets = np.arange(360 * self.ANGLE_RESOLUTION)
+        bucket_angles = (buckets + 0.5) / self.ANGLE_RESOLUTION
+        self._angle_leds = np.floor(
+            (bucket_angles - offset) / self._angular_spacing + 0.5
+        ).astype(int) % led_count
+
+        # Plain Python copies of the tables, for single lookups
+        self._led_coords = tuple((radius, angle) for angle in self.angles)
+        self._sector_list = tuple(tuple(sector) for sector in self.sectors)
+        self._box_list = tuple(
+            ((x_min, y_min), (x_max, y_max))
+            for x_min, y_min, x_max, y_max in self.boxes.tolist()
+        )
+
     def __len__(self):
         return self.led_count
 
+    def _get_sector_boxes(self):
+        """ Get the box covering the four corners of each LED's sector
+        """
+        radius_range = self._thickness / 2
+        radii = np.array([
+            self.radius - radius_range, self.radius - radius_range,
+            self.radius + radius_range, self.radius + radius_range
+        ])
+        thetas = np.radians(self.sectors[:, [0, 1, 0, 1]])
+
+        x_vals = radii * np.cos(thetas)
+        y_vals = radii * np.sin(thetas)
+
+        return np.column_stack((
+            x_vals.min(axis=1), y_vals.min(axis=1),
+            x_vals.max(axis=1), y_vals.max(axis=1)
+        ))
+
     def get_addr_from_angle(self, angle):
-        return int((self._angular_spacing - self._offset) / angle)
+        """ Get the index of the LED whose sector holds an angle, in degrees
+        """
+        bucket = int(angle % 360 * self.ANGLE_RESOLUTION)
+        return int(self._angle_leds[bucket % len(self._angle_leds)])
+
+    def get_addrs_from_angles(self, angles):
+        """ Get the indices of the LEDs at an array of angles at once
+        """
+        buckets = (np.asarray(angles) % 360 * self.ANGLE_RESOLUTION)
+        return self._angle_leds[buckets.astype(int) % len(self._angle_leds)]
 
     def get_led_angle(self, led_idx):
-        return led_idx * self._angular_spacing + self._offset
+        return self.angles[led_idx]
 
     def get_led_coords(self, led_idx):
-        return (
-            self.radius,
-            self.get_led_angle(led_idx)
-        )
+        return self._led_coords[led_idx]
+
+    def get_sector_angles(self, led_idx):
+        """ Get the (start, end) angles of the sector lit by an LED
+        """
+        return self._sector_list[led_idx]
 
     def get_bounding_sector(self, led_idx):
-        theta = self.get_led_angle(led_idx)
-        theta_range = self._angular_spacing / 2
+        start, end = self._sector_list[led_idx]
         radius_range = self._thickness / 2
 
         return {
-            'outer-left': (
-                self.radius + radius_range,
-                theta - theta_range
-            ),
-            'outer-right': (
-                self.radius + radius_range,
-                theta + theta_range
-            ),
-            'inner-left': (
-                self.radius - radius_range,
-                theta - theta_range
-            ),
-            'inner-right': (
-                self.radius - radius_range,
-                theta + theta_range
-            ),
+            'outer-left': (self.radius + radius_range, start),
+            'outer-right': (self.radius + radius_range, end),
+            'inner-left': (self.radius - radius_range, start),
+            'inner-right': (self.radius - radius_range, end),
         }
 
+    def get_bounding_box(self, led_idx):
+        return self._box_list[led_idx]
+
 
 class Polar(Coords):
 
@@ -76,6 +133,8 @@ class Polar(Coords):
             in zip(led_rings, ring_radii, ring_thicknesses, ring_offsets)
         ]
 
+        self.leds = LedRings.get(led_rings)
+
         super(Polar, self).__init__()
 
     def get_addr_from_coords(self, coords):
@@ -87,53 +146,67 @@ class Polar(Coords):
         ring, led_idx = addr
         return self._rings[ring].get_led_coords(led_idx)
 
+    def get_led_count(self):
+        return sum(len(ring) for ring in self._rings)
+
+    def get_sector_angles(self, addr):
+        ring, led_idx = addr
+        return self._rings[ring].get_sector_angles(led_idx)
+
     def get_bounding_sector(self, addr):
         ring, led_idx = addr
         return self._rings[ring].get_bounding_sector(led_idx)
 
     def get_bounding_box(self, addr):
-        bounding_sector = self.get_bounding_sector(addr)
-        cartesians = [
-            Coords.polar_to_cartesian(*polar) for polar \
-            in bounding_sector.values()
-        ]
-
-        x_vals, y_vals = zip(*cartesians)
-
-        return (
-            (min(x_vals), min(y_vals)),
-            (max(x_vals), max(y_vals))
+        ring, led_idx = addr
+        return self._rings[ring].get_bounding_box(led_idx)
+
+    def _get_arc_leds(self, ring_no, start, end):
+        """
+        Get the indices of the LEDs of a ring going clockwise from start to
+        end, both included. Each end is an LED address or an angle.
+
+        :returns: Array of LED indices
+        :rtype: numpy.ndarray
+        """
+        ring = self._rings[ring_no]
+
+        if type(start) == tuple:
+            start_idx = start[1] % len(ring)
+        else:
+            start_idx = ring.get_addr_from_angle(start)
+
+        if type(end) == tuple:
+            end_idx = end[1] % len(ring)
+        else:
+            end_idx = ring.get_addr_from_angle(end)
+
+        arc_length = (end_idx - start_idx) % len(ring) + 1
+
+        return (start_idx + np.arange(arc_length)) % len(ring)
+
+    def _build_shader_coords(self):
+        coords = Coords._build_shader_coords(self)
+        coords['ring'], coords['led'] = np.array(self.leds, dtype=float).T
+
+        coords['angle'] = np.concatenate(
+            [ring.angles for ring in self._rings]
+        ).astype(float)
+        radii = np.concatenate(
+            [np.full(len(ring), ring.radius, dtype=float)
+             for ring in self._rings]
         )
+        coords['x'] = radii * np.cos(np.radians(coords['angle']))
+        coords['y'] = radii * np.sin(np.radians(coords['angle']))
 
+        return coords
 
-    def _generate_coordinates(self):
-        for ring_no, ring in enumerate(self._rings):
-            for led_no in xrange(len(ring)):
-                name = chr(ord('A') + ring_no) + str(led_no + 1)
-                self._inject_global_variables(name, (ring_no, led_no))
-
-                name = chr(ord('a') + ring_no) + str(led_no + 1)
-                self._inject_global_variables(name, (ring_no, led_no))
-
-    def _generate_global_helpers(self):
-        self.reset_exports()
-
-    def _ring_iter(self, loop=False):
-        def ring(ring_no):
-            led_count = len(self._rings[ring_no])
-            for i in xrange(led_count):
-                yield tuple((ring_no, i))
-
-        def all_rings():
-            for ring_no, dummy in enumerate(self._rings):
-                for i in ring(ring_no):
-                    yield i
-
-        if loop:
-            return itertools.cycle(all_rings())
+    def _get_coordinate_names(self):
+        names = {}
 
-        return all_rings()
+        for addr in self.leds:
+            ring_no, led_no = addr
+            names[chr(ord('A') + ring_no) + str(led_no + 1)] = addr
+            names[chr(ord('a') + ring_no) + str(led_no + 1)] = addr
 
-    def reset_exports(self):
-        self._inject_global_variables('board', self._ring_iter())
-        self._inject_global_variables('baord_loop', self._ring_iter(loop=True))
+        return names
@@ -0,0 +1,152 @@
+# debug_recorder.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Records the frames of the simulator in the background, for debugging
+
+import os
+import threading
+from collections import deque
+
+from PIL import Image
+
+from kano.utils import ensure_dir, chown_path
+from kano.logging import logger
+
+
+class DebugFrameRecorder(object):
+    """
+    Keeps the last frames sent by a simulation board and writes them to disk
+    from a background thread.
+
+    Frames are stored as the raw LEDs images, which are small, and only the
+    last `max_frames` are kept on disk. The board images with the LEDs drawn
+    on them are only composed when save_composed_frames() is called.
+    """
+    _instance = None
+
+    RAW_FRAME_TEMPLATE = 'frame-{:06}.png'
+    COMPOSED_FRAME_TEMPLATE = 't{}.png'
+
+    @staticmethod
+    def get_inst(output_path):
+        """ Get the (singleton) instance of this class
+        """
+        if not DebugFrameRecorder._instance:
+            DebugFrameRecorder._instance = DebugFrameRecorder(output_path)
+
+        return DebugFrameRecorder._instance
+
+    def __init__(self, output_path, max_frames=500, buffer_size=64):
+        """ Please do not use this constructor on its own, but rather call the
+        DebugFrameRecorder.get_inst() method
+        :param output_path: Directory where the frames are written
+        :type output_path: str
+        :param max_frames: Number of frames kept on disk
+        :type max_frames: int
+        :param buffer_size: Number of frames kept in memory while they wait to
+                            be written, older frames are dropped first
+        :type buffer_size: int
+        """
+        self.output_path = output_path
+        self.raw_path = os.path.join(output_path, 'raw')
+        self.max_frames = max_frames
+
+        self._frames = deque(maxlen=buffer_size)
+        self._frames_available = threading.Condition()
+
+        # Files of the frames written to disk, the oldest first. Frames dropped
+        # from the buffer are never written, so the files are rotated by what
+        # was actually written rather than by frame number.
+        self._written = deque()
+        self._count = 0
+        self._writer_thread = None
+
+    def capture(self, im):
+        """ Add a frame to the ring buffer, to be written in the background
+        :param im: LEDs image of the board
+        :type im: PIL.Image.Image
+        """
+        with self._frames_available:
+            self._frames.append((self._count, im.copy()))
+            self._count += 1
+
+            if not self._writer_thread:
+                self._start_writer()
+
+            self._frames_available.notify()
+
+    def _start_writer(self):
+        ensure_dir(self.raw_path)
+        chown_path(self.output_path)
+        chown_path(self.raw_path)
+
+        # Frames left over from a previous run would be mixed with ours
+        for frame in os.listdir(self.raw_path):
+            try:
+                os.unlink(os.path.join(self.raw_path, frame))
+            except OSError:
+                pass
+
+        self._writer_thread = threading.Thread(target=self._thr_write_frames)
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def _thr_write_frames(self):
+        while True:
+            with self._frames_available:
+                while not self._frames:
+                    self._frames_available.wait()
+
+                index, im = self._frames.popleft()
+
+            try:
+                self._write_frame(index, im)
+            except (IOError, OSError) as exc:
+                logger.warn("Couldn't write debug frame [{}]".format(exc))
+
+    def _write_frame(self, index, im):
+        filename = os.path.join(
+            self.raw_path, self.RAW_FRAME_TEMPLATE.format(index)
+        )
+        im.save(filename)
+        chown_path(filename)
+
+        # Rotate the frames on disk
+        self._written.append(filename)
+        while len(self._written) > self.max_frames:
+            old_filename = self._written.popleft()
+            if os.path.exists(old_filename):
+                os.unlink(old_filename)
+
+    def save_composed_frames(self, board_class):
+        """ Compose the frames kept on disk onto the board image and save them
+        as PNGs in the output directory
+        :param board_class: Simulation board class the frames were recorded from
+        :type board_class: SimulationBoard subclass
+        :returns: List of the paths to the PNGs
+        :rtype: list of str
+        """
+        if not os.path.isdir(self.raw_path):
+            return []
+
+        compositor = board_class.create_compositor()
+        paths = []
+
+        for index, frame in enumerate(sorted(os.listdir(self.raw_path))):
+            im = Image.open(os.path.join(self.raw_path, frame))
+
+            if compositor:
+                board = compositor.compose(im)
+            else:
+                board = board_class.board_from_image(im)
+
+            filename = os.path.join(
+                self.output_path, self.COMPOSED_FRAME_TEMPLATE.format(index)
+            )
+            board.save(filename)
+            chown_path(filename)
+            paths.append(filename)
+
+        return paths
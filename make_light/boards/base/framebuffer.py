@@ -0,0 +1,184 @@
+# framebuffer.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# The array of LEDs that boards draw on and drivers read from
+
+import numbers
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+class Framebuffer(object):
+    """
+    The colours of the LEDs of a board, kept in a numpy array of uint8.
+
+    Grids of LEDs use a (height, width, channels) array. Rings of LEDs use a
+    (count, channels) array. Boards draw into the array. The simulator, the
+    GIF recorder and the hardware drivers read it directly.
+
+    Shapes are rasterised by ImageDraw into a mask, so they light the same
+    LEDs as they did when drawn on a PIL image.
+    """
+
+    MODES = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+    def __init__(self, shape, channels=3):
+        """
+        :param shape: (height, width) of a grid or (count,) of a ring of LEDs
+        :type shape: tuple
+        :param channels: Number of colour channels, 1 for monochrome LEDs, 3
+                         for RGB and 4 for RGBA, which can be shared with PIL
+        :type channels: int
+        """
+        self.channels = channels
+        self.pixels = np.zeros(tuple(shape) + (channels,), dtype=np.uint8)
+        self._image = None
+
+    @property
+    def size(self):
+        """ The (width, height) of a grid, as PIL gives the size of images
+        """
+        return self.pixels.shape[1], self.pixels.shape[0]
+
+    @property
+    def image(self):
+        """ A PIL image of the grid.
+
+        With 1 or 4 channels the image shares the memory of the framebuffer,
+        so it always shows its current state and must be copied to keep a
+        frame. PIL keeps RGB images with 4 bytes per pixel, so for 3 channels
+        a new copy is returned.
+        """
+        if self.channels == 3:
+            return Image.fromarray(self.pixels, 'RGB')
+
+        if self._image is None:
+            mode = self.MODES[self.channels]
+            self._image = Image.frombuffer(
+                mode, self.size, self.pixels, 'raw', mode, 0, 1
+            )
+
+        return self._image
+
+    def get_colour(self, colour):
+        """ Convert a PIL colour to the channels of the framebuffer.
+        RGB colours get an opaque alpha channel, as PIL gives them.
+        """
+        if isinstance(colour, numbers.Number):
+            colour = (colour,)
+
+        colour = tuple(int(channel) for channel in colour)
+
+        if len(colour) == 3 and self.channels == 4:
+            colour += (255,)
+
+        return colour[:self.channels]
+
+    def fill(self, colour, box=None):
+        """ Set all the LEDs, or the ones within a (left, top, right, bottom)
+        box of a grid, to a colour
+        """
+        colour = self.get_colour(colour)
+
+        if box:
+            left, top, right, bottom = box
+            self.pixels[top:bottom, left:right] = colour
+        else:
+            self.pixels[...] = colour
+
+    def set_points(self, points, colour):
+        """ Set the colour of the LEDs of a grid at (x, y) points, ignoring
+        the points outside of it
+
+        :returns: The box covering the points which were set or None
+        :rtype: tuple
+        """
+        width, height = self.size
+        points = [
+            (int(x), int(y)) for x, y in points
+            if 0 <= x < width and 0 <= y < height
+        ]
+        if not points:
+            return None
+
+        x_vals, y_vals = zip(*points)
+        self.pixels[y_vals, x_vals] = self.get_colour(colour)
+
+        return min(x_vals), min(y_vals), max(x_vals) + 1, max(y_vals) + 1
+
+    def set_leds(self, indices, colour):
+        """ Set the colour of the LEDs of a ring at the given indices
+        """
+        self.pixels[list(indices)] = self.get_colour(colour)
+
+    def fill_mask(self, mask, colour, box=None):
+        """ Set the colour of the LEDs of a grid where a boolean mask is set
+
+        :param mask: Boolean array of the size of `box`
+        :type mask: numpy.ndarray
+        :param box: The (left, top, right, bottom) box which the mask covers,
+                    defaults to the whole grid
+        :type box: tuple
+        """
+        region = self.pixels
+        if box:
+            left, top, right, bottom = box
+            region = region[top:bottom, left:right]
+
+        region[mask] = self.get_colour(colour)
+
+    def blit(self, pixels, mask, where):
+        """ Copy pixels onto the grid where a mask is set, clipped to the grid
+
+        :param pixels: Array of (height, width, channels) pixels
+        :type pixels: numpy.ndarray
+        :param mask: Boolean array of (height, width)
+        :type mask: numpy.ndarray
+        :param where: The (x, y) position of the top left pixel on the grid
+        :type where: tuple
+        :returns: The box which was drawn or None if it is off the grid
+        :rtype: tuple
+        """
+        x, y = int(where[0]), int(where[1])
+        height, width = mask.shape
+        grid_width, grid_height = self.size
+
+        box = (
+            max(0, x), max(0, y),
+            min(grid_width, x + width), min(grid_height, y + height)
+        )
+        left, top, right, bottom = box
+        if left >= right or top >= bottom:
+            return None
+
+        pixels = pixels[top - y:bottom - y, left - x:right - x]
+        mask = mask[top - y:bottom - y, left - x:right - x]
+        region = self.pixels[top:bottom, left:right]
+
+        if mask.all():
+            region[...] = pixels
+        else:
+            region[mask] = pixels[mask]
+
+        return box
+
+    def draw(self, shape, colour):
+        """ Fill a shape drawn with ImageDraw
+
+        :param shape: Function called with the ImageDraw.Draw of a mask of
+                      the grid, in which it draws the shape with fill=255
+        :type shape: function
+        :returns: The box covering the shape or None if it is empty
+        :rtype: tuple
+        """
+        mask = Image.new('L', self.size)
+        shape(ImageDraw.Draw(mask))
+
+        box = mask.getbbox()
+        if box:
+            self.fill_mask(np.asarray(mask.crop(box)) > 0, colour, box)
+
+        return box
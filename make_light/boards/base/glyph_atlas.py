@@ -0,0 +1,104 @@
+# glyph_atlas.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Renders text for the boards from glyphs which are only drawn once
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from make_light.paths import FONTS_DIR
+from make_light.boards.base.sprite import Sprite
+
+
+class GlyphAtlas(object):
+    """
+    The glyphs of a bitmap font, drawn the first time each character is used.
+
+    Text is rendered by putting the glyphs of its characters side by side,
+    which gives the same pixels as drawing it with ImageDraw.text(). The font
+    itself is only loaded when text is first rendered.
+    """
+    _instances = {}
+
+    DEFAULT_FONT = 'atari-small.pil'
+
+    # Number of rendered strings which are kept
+    MAX_TEXTS = 32
+
+    @staticmethod
+    def get_inst(font_name=DEFAULT_FONT):
+        """ Get the (singleton) instance of this class for a font
+        """
+        if font_name not in GlyphAtlas._instances:
+            GlyphAtlas._instances[font_name] = GlyphAtlas(font_name)
+
+        return GlyphAtlas._instances[font_name]
+
+    def __init__(self, font_name):
+        """ Please do not use this constructor on its own, but rather call the
+        GlyphAtlas.get_inst() method
+        :param font_name: File name of the PIL font, in FONTS_DIR
+        :type font_name: str
+        """
+        self.font_path = os.path.join(FONTS_DIR, font_name)
+
+        self._font = None
+        self._glyphs = {}
+        self._texts = OrderedDict()
+
+    @property
+    def font(self):
+        if not self._font:
+            self._font = ImageFont.load(self.font_path)
+
+        return self._font
+
+    def get_size(self, text):
+        """ Get the (width, height) of a string, as ImageFont.getsize() does
+        """
+        if not text:
+            return self.font.getsize(text)
+
+        glyphs = [self.get_glyph(char) for char in text]
+
+        return sum(glyph.shape[1] for glyph in glyphs), glyphs[0].shape[0]
+
+    def get_glyph(self, char):
+        """ Get the boolean mask of a character, as wide as its advance
+        """
+        glyph = self._glyphs.get(char)
+
+        if glyph is None:
+            mask = Image.new('L', self.font.getsize(char))
+            ImageDraw.Draw(mask).text((0, 0), char, font=self.font, fill=255)
+
+            glyph = self._glyphs[char] = np.asarray(mask) > 0
+
+        return glyph
+
+    def render(self, text):
+        """ Get a Sprite of a string in white, with the background transparent
+        """
+        sprite = self._texts.pop(text, None)
+
+        if sprite is None:
+            if text:
+                mask = np.hstack([self.get_glyph(char) for char in text])
+            else:
+                mask = np.zeros((self.font.getsize(text)[1], 0), dtype=bool)
+
+            colours = np.zeros(mask.shape + (3,), dtype=np.uint8)
+            colours[mask] = 255
+            sprite = Sprite(colours, mask)
+
+        # Keep the most recently used strings last and forget the oldest ones
+        self._texts[text] = sprite
+        while len(self._texts) > self.MAX_TEXTS:
+            self._texts.popitem(last=False)
+
+        return sprite
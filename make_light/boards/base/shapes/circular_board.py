@@ -5,8 +5,12 @@
 #
 # Implements methods for circular boards
 
+import numpy as np
+from PIL import Image, ImageDraw
+
 from make_light.boards.base.simulation_board import SimulationBoard
 from make_light.boards.base.coords.polar import Polar
+from make_light.boards.base.colours.colour_palette import BLACK
 
 
 class CircularBoard(SimulationBoard, Polar):
@@ -15,6 +19,9 @@ class CircularBoard(SimulationBoard, Polar):
     RING_THICKNESSES = [0]
     RING_OFFSETS = [0]
 
+    # Masks of the LED sectors, shared by all the boards with the same geometry
+    _SECTOR_MASKS = {}
+
     def __init__(self):
         self._DIMENSIONS = self.IMAGE_DIMENSIONS
 
@@ -22,6 +29,50 @@ class CircularBoard(SimulationBoard, Polar):
         Polar.__init__(self, self.LED_RINGS, self.RING_RADII,
                        self.RING_THICKNESSES, self.RING_OFFSETS)
 
+        self._sector_masks, self._ring_masks = self._get_sector_masks()
+
+    def _get_sector_masks(self):
+        """
+        Get the masks used to light each LED and each whole ring. Each mask is
+        a (box, mask) tuple, where the mask is a boolean array cropped to the
+        box it covers on the LEDs image. They are only drawn once for each
+        board geometry.
+        """
+        sectors = tuple(
+            tuple(
+                ring.get_sector_angles(led_no) for led_no in xrange(len(ring))
+            )
+            for ring in self._rings
+        )
+        key = (self.IMAGE_DIMENSIONS, sectors)
+
+        if key not in CircularBoard._SECTOR_MASKS:
+            CircularBoard._SECTOR_MASKS[key] = (
+                [
+                    [self._draw_sector_mask(start, end)
+                     for start, end in ring_sectors]
+                    for ring_sectors in sectors
+                ],
+                [self._draw_sector_mask(0, 360) for dummy in sectors]
+            )
+
+        return CircularBoard._SECTOR_MASKS[key]
+
+    def _draw_sector_mask(self, start, end):
+        mask = Image.new('L', self.IMAGE_DIMENSIONS)
+        # FIXME: Draw only the arc, not the whole slice
+        ImageDraw.Draw(mask).pieslice(
+            ((0, 0), self.IMAGE_DIMENSIONS), start, end, fill=255
+        )
+        box = mask.getbbox()
+
+        return box, np.asarray(mask.crop(box)) > 0
+
+    def _fill_masks(self, masks, fill):
+        for box, mask in masks:
+            self._framebuffer.fill_mask(mask, fill, box)
+            self._mark_dirty(box)
+
     def on(self, *args, **kwargs):
         """
         This function has several use cases:
@@ -44,15 +95,12 @@ class CircularBoard(SimulationBoard, Polar):
         leds, dummy_intensity = self._parse_coord_args(*args)
         fill = self._parse_colour_kwargs(**kwargs)
 
-        for loc in leds:
-            bounding_box = self.get_bounding_box(loc)
-            bounding_sector = self.get_bounding_sector(loc)
-            # FIXME: Draw only the arc, not the whole slice
-            self._board_lights_draw.pieslice(
-                ((0, 0), self.IMAGE_DIMENSIONS),
-                bounding_sector['inner-left'][1],
-                bounding_sector['inner-right'][1], fill=fill
-            )
+        masks = []
+        for ring_no, led_no in leds:
+            ring_masks = self._sector_masks[ring_no]
+            masks.append(ring_masks[led_no % len(ring_masks)])
+
+        self._fill_masks(masks, fill)
 
         self._update()
 
@@ -61,7 +109,7 @@ class CircularBoard(SimulationBoard, Polar):
             # Last argument is interpreted as intensity
             self.on(*args + (0.0,))
         else:
-            self.on(*args, colour=__builtins__['black'])
+            self.on(*args, colour=BLACK)
 
     def arc(self, ring_no, start, end, **kwargs):
         '''
@@ -70,23 +118,57 @@ class CircularBoard(SimulationBoard, Polar):
         @param end     angle or LED
         '''
 
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        if type(start) == tuple and type(end) == tuple and start[0] == end[0]:
+            # Light the LEDs from start to end with their precomputed masks
+            ring_masks = self._sector_masks[start[0]]
+
+            self._fill_masks(
+                [ring_masks[led_no]
+                 for led_no in self._get_arc_leds(start[0], start, end)],
+                fill
+            )
+            self._update()
+            return
+
         if type(start) == tuple:
-            start_bounding_sector = self.get_bounding_sector(start)
-            start = start_bounding_sector['inner-left'][1]
+            start = self.get_sector_angles(start)[0]
 
         if type(end) == tuple:
-            end_bounding_sector = self.get_bounding_sector(end)
-            end = end_bounding_sector['inner-right'][1]
+            end = self.get_sector_angles(end)[1]
 
-        fill = self._parse_colour_kwargs(**kwargs)
-        self._board_lights_draw.pieslice(
-            ((0, 0), self.IMAGE_DIMENSIONS), start, end, fill=fill
+        self._draw(
+            lambda draw: draw.pieslice(
+                ((0, 0), self.IMAGE_DIMENSIONS), start, end, fill=255
+            ),
+            fill
         )
 
         self._update()
 
     def circle(self, radius, **kwargs):
-        CircularBoard.arc(self, radius, 0, 360, **kwargs)
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        self._fill_masks([self._ring_masks[radius]], fill)
+
+        self._update()
+
+    def frame(self, buffer):
+        """
+        Light all the LEDs at once, with a colour or brightness for each LED
+        in the order of `board`, i.e. ring by ring. See Board._parse_frame()
+        """
+        colours = self._parse_frame(buffer)
+        masks = [
+            mask for ring_masks in self._sector_masks for mask in ring_masks
+        ]
+
+        for (box, mask), colour in zip(masks, colours):
+            self._framebuffer.fill_mask(mask, colour, box)
+        self._mark_dirty()
+
+        self._update()
 
     def all(self, *args, **kwargs):
         on = args[0] if args else True
@@ -94,6 +176,7 @@ class CircularBoard(SimulationBoard, Polar):
         kwargs.update({'on': on})
         fill = self._parse_colour_kwargs(**kwargs)
 
-        self._board_lights_draw.rectangle(((0, 0), self._DIMENSIONS), fill=fill)
+        self._framebuffer.fill(fill)
+        self._mark_dirty()
 
         self._update()
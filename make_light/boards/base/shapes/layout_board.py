@@ -0,0 +1,194 @@
+# layout_board.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Implements methods for boards with LEDs placed anywhere
+
+import os
+import numbers
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from make_light.boards.base.simulation_board import SimulationBoard
+from make_light.boards.base.coords.layout import Layout
+from make_light.boards.base.colours.colour_palette import BLACK
+
+
+class LayoutBoard(SimulationBoard, Layout):
+    """
+    A board of LED strips and panels, whose LEDs are placed anywhere. The
+    positions of the LEDs are loaded from LAYOUT_FILE in the board directory,
+    in pixels of the board image, see Layout.load_strips().
+
+    Shapes light the LEDs whose centres they cover, which are found with the
+    spatial index of the layout. Lines light the LEDs within LED_RADIUS of
+    them.
+    """
+    LAYOUT_FILE = 'leds.json'
+    LED_RADIUS = 4
+
+    def __init__(self):
+        self._DIMENSIONS = self.IMAGE_DIMENSIONS
+
+        SimulationBoard.__init__(self)
+        Layout.__init__(
+            self,
+            self.load_strips(os.path.join(self.BOARD_DIR, self.LAYOUT_FILE)),
+            self.LED_RADIUS
+        )
+
+        self._led_masks = self._get_led_masks()
+
+    def _get_led_masks(self):
+        """
+        Get the (box, mask) used to light each LED, in the order of `board`.
+        Each mask is the disc of the LED, cropped to the LEDs image.
+        """
+        radius = int(self.LED_RADIUS)
+        disc = Image.new('L', (2 * radius + 1, 2 * radius + 1))
+        ImageDraw.Draw(disc).ellipse(
+            ((0, 0), (2 * radius, 2 * radius)), fill=255
+        )
+        disc = np.asarray(disc) > 0
+
+        width, height = self._DIMENSIONS
+        masks = []
+
+        for x, y in np.rint(self._led_index.positions).astype(int).tolist():
+            box = (
+                max(0, x - radius), max(0, y - radius),
+                min(width, x + radius + 1), min(height, y + radius + 1)
+            )
+            mask = disc[
+                box[1] - (y - radius):box[3] - (y - radius),
+                box[0] - (x - radius):box[2] - (x - radius)
+            ]
+            masks.append((box, mask))
+
+        return masks
+
+    def _fill_leds(self, leds, fill):
+        """ Light the LEDs at the given positions in the order of `board`
+        """
+        for idx in leds:
+            box, mask = self._led_masks[idx]
+            if mask.size:
+                self._framebuffer.fill_mask(mask, fill, box)
+                self._mark_dirty(box)
+
+        self._update()
+
+    def on(self, *args, **kwargs):
+        """
+        light.on(position...)
+        light.on(position..., intensity)
+        light.on(position..., colour=...)
+        light.on(position..., intensity, colour=...)
+        light.on(all)
+        light.on(all, intensity)
+        light.on(all, colour=...)
+
+        The intensity is given as a brightness of frame(): True/False, a
+        level from 0 to 7 or a fraction from 0.0 to 1.0.
+        """
+        leds, intensity = self._parse_coord_args(*args)
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        if args and not self.is_pos(args[-1]):
+            fill = self._get_intensity_colour(fill, intensity)
+
+        self._fill_leds([self._get_led_index(led) for led in leds], fill)
+
+    def _get_intensity_colour(self, colour, intensity):
+        """ Get the colour of LEDs lit at an intensity. Monochrome LEDs are
+        lit in their hue, others in the colour dimmed to the intensity.
+        """
+        if isinstance(intensity, bool):
+            brightness = 1. if intensity else 0.
+        elif isinstance(intensity, numbers.Integral):
+            brightness = intensity / 7.
+        else:
+            brightness = float(intensity)
+
+        brightness = max(0., min(1., brightness))
+
+        if self.MONOCHROME:
+            return self.get_colour_at_intensity(self.HUE, 100 * brightness)
+
+        return tuple(int(channel * brightness) for channel in colour[:3])
+
+    def off(self, *args):
+        if self.MONOCHROME:
+            # Last argument is interpreted as intensity
+            self.on(*args + (0.0,))
+        else:
+            self.on(*args, colour=BLACK)
+
+    def all(self, *args, **kwargs):
+        on = args[0] if args else True
+
+        kwargs.update({'on': on})
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        self._fill_leds(xrange(len(self._led_masks)), fill)
+
+    def frame(self, buffer):
+        """
+        Light all the LEDs at once, with a colour or brightness for each LED
+        in the order of `board`, i.e. strip by strip. See Board._parse_frame()
+        """
+        colours = self._parse_frame(buffer)
+
+        for (box, mask), colour in zip(self._led_masks, colours):
+            if mask.size:
+                self._framebuffer.fill_mask(mask, colour, box)
+        self._mark_dirty()
+
+        self._update()
+
+    def rectangle(self, A, B, on=True, **kwargs):
+        kwargs.update({'on': on})
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        left, right = sorted((A[0], B[0]))
+        top, bottom = sorted((A[1], B[1]))
+
+        self._fill_leds(
+            self._led_index.in_box((left, top, right, bottom)), fill
+        )
+
+    def line(self, A, B, on=True, **kwargs):
+        kwargs.update({'on': on})
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        self._fill_leds(
+            self._led_index.near_segment(A, B, self.LED_RADIUS), fill
+        )
+
+    def circle(self, size, where, on=True, **kwargs):
+        kwargs.update({'on': on})
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        self._fill_leds(self._led_index.in_circle(where, size / 2.), fill)
+
+    def ellipse(self, A, B, on=True, **kwargs):
+        kwargs.update({'on': on})
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        left, right = sorted((A[0], B[0]))
+        top, bottom = sorted((A[1], B[1]))
+
+        self._fill_leds(
+            self._led_index.in_ellipse((left, top, right, bottom)), fill
+        )
+
+    def triangle(self, a, b, c, on=True, **kwargs):
+        self.polygon([a, b, c], on, **kwargs)
+
+    def polygon(self, points, on=True, **kwargs):
+        kwargs.update({'on': on})
+        fill = self._parse_colour_kwargs(**kwargs)
+
+        self._fill_leds(self._led_index.in_polygon(points), fill)
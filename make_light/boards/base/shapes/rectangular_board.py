@@ -5,18 +5,17 @@
 #
 # Implements methods for rectangular board
 
-import os
 import time
-from PIL import ImageFont
 
 from make_light.boards.base.simulation_board import SimulationBoard
+from make_light.boards.base.sprite import Sprite
+from make_light.boards.base.glyph_atlas import GlyphAtlas
 from make_light.boards.base.coords.cartesian import Cartesian
-from make_light.paths import FONTS_DIR
+from make_light.boards.base.colours.colour_palette import BLACK, WHITE
 
 
 class RectangularBoard(SimulationBoard, Cartesian):
     ASPECT_RATIO = 1
-    FONT = ImageFont.load(os.path.join(FONTS_DIR, 'atari-small.pil'))
 
     H_LED_COUNT = 0
     V_LED_COUNT = 0
@@ -61,8 +60,13 @@ class RectangularBoard(SimulationBoard, Cartesian):
                 self.HUE, 100 * float(intensity)
             )
 
-        for loc in leds:
-            self._board_lights_draw.point(loc, fill=fill)
+        if leds is self.leds:
+            self._framebuffer.fill(fill)
+            self._mark_dirty()
+        else:
+            box = self._framebuffer.set_points(leds, fill)
+            if box:
+                self._mark_dirty(box)
 
         self._update()
 
@@ -71,7 +75,7 @@ class RectangularBoard(SimulationBoard, Cartesian):
             # Last argument is interpreted as intensity
             self.on(*args + (0.0,))
         else:
-            self.on(*args, colour=__builtins__['black'])
+            self.on(*args, colour=BLACK)
 
     def all(self, *args, **kwargs):
         on = args[0] if args else True
@@ -86,7 +90,8 @@ class RectangularBoard(SimulationBoard, Cartesian):
                 self.HUE, 100 * intensity / 7.
             )
 
-        self._board_lights_draw.rectangle(((0, 0), self._DIMENSIONS), fill=fill)
+        self._framebuffer.fill(fill)
+        self._mark_dirty()
 
         self._update()
 
@@ -94,7 +99,7 @@ class RectangularBoard(SimulationBoard, Cartesian):
         kwargs.update({'on': on})
         fill = self._parse_colour_kwargs(**kwargs)
 
-        self._board_lights_draw.rectangle((A, B), fill=fill)
+        self._draw(lambda draw: draw.rectangle((A, B), fill=255), fill)
 
         self._update()
 
@@ -102,7 +107,7 @@ class RectangularBoard(SimulationBoard, Cartesian):
         kwargs.update({'on': on})
         fill = self._parse_colour_kwargs(**kwargs)
 
-        self._board_lights_draw.line((A, B), fill=fill)
+        self._draw(lambda draw: draw.line((A, B), fill=255), fill)
 
         self._update()
 
@@ -114,64 +119,99 @@ class RectangularBoard(SimulationBoard, Cartesian):
 
         xsize = size * (1 / self.ASPECT_RATIO)
 
-        self._board_lights_draw.ellipse(
-            (
-                (x - int(xsize / 2), y - int(size / 2)),
-                (x + int(xsize / 2), y + int(size / 2))
-            ),
-            fill
+        box = (
+            (x - int(xsize / 2), y - int(size / 2)),
+            (x + int(xsize / 2), y + int(size / 2))
         )
+        self._draw(lambda draw: draw.ellipse(box, fill=255), fill)
         self._update()
 
     def ellipse(self, A, B, on=True, **kwargs):
         kwargs.update({'on': on})
         fill = self._parse_colour_kwargs(**kwargs)
 
-        self._board_lights_draw.ellipse((A, B), fill=fill)
+        self._draw(lambda draw: draw.ellipse((A, B), fill=255), fill)
         self._update()
 
     def arc(self, middle, start, end, on=True, **kwargs):
         kwargs.update({'on': on})
         fill = self._parse_colour_kwargs(**kwargs)
 
-        self._board_lights_draw.arc(middle, start, end, fill=fill)
+        self._draw(lambda draw: draw.arc(middle, start, end, fill=255), fill)
         self._update()
 
     def triangle(self, a, b, c, on=True, **kwargs):
         kwargs.update({'on': on})
         fill = self._parse_colour_kwargs(**kwargs)
 
-        self._board_lights_draw.polygon([a, b, c], fill=fill)
+        self._draw(lambda draw: draw.polygon([a, b, c], fill=255), fill)
         self._update()
 
     def polygon(self, points, on=True, **kwargs):
         kwargs.update({'on': on})
         fill = self._parse_colour_kwargs(**kwargs)
 
-        self._board_lights_draw.polygon(points, fill=fill)
+        self._draw(lambda draw: draw.polygon(points, fill=255), fill)
+        self._update()
+
+    def frame(self, buffer):
+        """
+        Light all the LEDs at once, with a colour or brightness for each LED
+        in the order of `board`, i.e. row by row. See Board._parse_frame()
+        """
+        colours = self._parse_frame(buffer)
+        width, height = self._DIMENSIONS
+
+        self._framebuffer.pixels[..., :3] = colours.reshape(height, width, 3)
+        self._framebuffer.pixels[..., 3] = 255
+        self._mark_dirty()
+
+        self._update()
+
+    def blit(self, sprite, where, **kwargs):
+        """
+        Draw a Sprite with its top left corner at `where`. The whole sprite is
+        drawn in `colour` if it is given.
+        """
+        pixels = sprite.get_pixels(
+            self._framebuffer.channels, self._parse_sprite_colour(**kwargs)
+        )
+
+        box = self._framebuffer.blit(pixels, sprite.mask, where)
+        if box:
+            self._mark_dirty(box)
+
         self._update()
 
+    def capture(self, A, B):
+        """
+        Get a Sprite of what is drawn in the rectangle from A to B
+        """
+        left, right = sorted((int(A[0]), int(B[0])))
+        top, bottom = sorted((int(A[1]), int(B[1])))
+
+        return Sprite.from_framebuffer(
+            self._framebuffer, (max(0, left), max(0, top), right + 1, bottom + 1)
+        )
+
     def scroll(self, text, delay=0.1, portrait=False, top=3):
-        text = text + '    '
-        (text_width, dummy_text_height) = self.FONT.getsize(text)
+        # The text is rendered once and slid across the board
+        strip = GlyphAtlas.get_inst().render(text + '    ')
+        pixels = strip.get_pixels(
+            self._framebuffer.channels, WHITE
+        )
         board_width, board_height = self._DIMENSIONS
-        for i in xrange(text_width):
-            self._board_lights_draw.rectangle(
-                (
-                    (board_width - i, 0),
-                    (board_width, board_height)
-                ),
-                fill=__builtins__['black']
-            )
-            self._board_lights_draw.text(
-                (board_width - i, top), text, font=self.FONT,
-                fill=__builtins__['white']
-            )
+
+        for i in xrange(strip.size[0]):
+            box = (max(0, board_width - i), 0, board_width, board_height)
+            self._framebuffer.fill(BLACK, box)
+            self._framebuffer.blit(pixels, strip.mask, (board_width - i, top))
+            self._mark_dirty(box)
             time.sleep(delay)
             self._update()
 
     def text(self, where, text):
-        self._board_lights_draw.text(
-            where, text, font=self.FONT, fill=__builtins__['white']
+        self.blit(
+            GlyphAtlas.get_inst().render(text), where,
+            colour=WHITE
         )
-        self._update()
@@ -6,15 +6,19 @@
 # Defines the abstraction of board used in the simulator
 
 import os
-from gi.repository import GdkPixbuf
-from PIL import Image, ImageDraw
-
-from kano.utils import ensure_dir, chown_path
+from collections import OrderedDict
+from gi.repository import GdkPixbuf, GLib
+from PIL import Image
 
 from make_light.paths import IMAGES_DIR, TEMP_DIR
 from make_light.boards.base.board import Board
 from make_light.boards.base.image_helpers import load_image, get_mask_path
-from make_light.boards.base.colours.colour_palette import ColourPalette
+from make_light.boards.base.compositor import BoardCompositor, SpriteCache
+from make_light.boards.base.framebuffer import Framebuffer
+from make_light.boards.base.debug_recorder import DebugFrameRecorder
+from make_light.boards.base.code_thread import CodeThread
+from make_light.boards.base.colours.colour_palette import ColourPalette, \
+    BLACK
 
 
 class SimulationBoard(Board):
@@ -23,6 +27,12 @@ class SimulationBoard(Board):
     BOARD_IMAGE_PATH = None
     _BOARD_IMAGE = None
     _BOARD_MASK_IMAGE = None
+    _COMPOSITOR = None
+
+    # Board layers scaled to the sizes the board was drawn at recently, by
+    # (board name, size), see _get_board_layers()
+    _BOARD_LAYERS = OrderedDict()
+    _MAX_BOARD_LAYERS = 4
     WELCOME_IMAGE_PATH = os.path.join(IMAGES_DIR, 'placeholders', 'welcome.gif')
 
     IMAGE_DIMENSIONS = (375, 375)
@@ -36,37 +46,35 @@ class SimulationBoard(Board):
     def __init__(self):
         self.connected = False
 
-        # For a full list of modes, visit:
-        # pillow.readthedocs.org/en/3.0.x/handbook/concepts.html#concept-modes
-        self._lights_mode = 'RGBA'
-
-        self._board_lights_image = Image.new(
-            self._lights_mode, self._DIMENSIONS
-        )
-        self._board_lights_draw = ImageDraw.Draw(self._board_lights_image)
+        # The LEDs are drawn in an RGBA framebuffer, which the LEDs image
+        # shares without copying, so it can be handed to the compositor, the
+        # GIF recorder and the shared framebuffer as it is
+        width, height = self._DIMENSIONS
+        self._framebuffer = Framebuffer((height, width), 4)
+        self._board_lights_image = self._framebuffer.image
 
         self.__class__.BOARD_IMAGE_PATH = os.path.join(
             self.__class__.BOARD_DIR, 'board.png'
         )
 
-        debug_path = os.path.join(TEMP_DIR, 'debug')
-        self._debug_filename_template = os.path.join(
-            debug_path, 't{}.png'
-        )
-        ensure_dir(debug_path)
-        chown_path(debug_path)
-        self._debug = True
-        self._count = 0
+        # Frames are only recorded for debugging when it is requested
+        self._debug = False
+
+        # Box of the LEDs image which changed since the last frame was sent
+        self._dirty_box = None
+
+        # Whether a frame was held back by a batch() block
+        self._batch_pending = False
 
     @property
     def board_image(self):
         raise NotImplementedError
 
-    def compose_image(self, im):
-        return self.image_to_pixbuf(im)
+    def compose_image(self, im, changed_box=None, compositor=None):
+        return self.image_to_pixbuf(im, changed_box, compositor)
 
     @classmethod
-    def image_to_pixbuf(cls, im):
+    def image_to_pixbuf(cls, im, changed_box=None, compositor=None):
         """
         Get a GkdPixbuf of an image with the LEDs drawn on the board image.
 
@@ -74,41 +82,71 @@ class SimulationBoard(Board):
             im: A PIL.Image.new object containing a 14x9 pixels image with
                 alpha channel. Each non transpareny pixel represents a lit
                 LED on the board.
-            board_image_path: The fullpath to the board image to use.
+            changed_box: See board_from_image()
+            compositor: See board_from_image()
 
         Returns:
             A GkdPixbuf object with the LEDs drawn on the given board image.
         """
-        img = cls.board_from_image(im)
+        if not compositor:
+            compositor = cls.get_compositor()
+            changed_box = None
 
-        # return an image that the Gtk widget can understand
-        rgb = img.convert("RGB")
-        pixl = GdkPixbuf.PixbufLoader.new_with_type('pnm')
+        if not compositor:
+            return cls.pil_to_pixbuf(cls.board_from_image(im))
 
-        #
-        # We embed the generated image onto a PNM, Gdk compatible one
-        # P6 is the magic number of PNM format, and 255 is the max color allowed
-        # see: https://en.wikipedia.org/wiki/Netpbm_format
-        #
-        pixl.write(
-            "P6 %d %d 255 " % (img.size[0], img.size[1]) + rgb.tostring()
-        )
-        pixbuf = pixl.get_pixbuf()
-        pixl.close()
+        return cls.bytes_to_pixbuf(*compositor.compose_bytes(im, changed_box))
+
+    @classmethod
+    def pil_to_pixbuf(cls, img):
+        """
+        Get a GdkPixbuf with the contents of a PIL.Image.new object.
+        """
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+
+        return cls.bytes_to_pixbuf(img.tobytes(), img.size)
+
+    @staticmethod
+    def bytes_to_pixbuf(data, size):
+        """
+        Get a GdkPixbuf of raw RGBA pixels, without decoding or converting
+        them. GLib.Bytes.new() makes a single copy of the pixels, which the
+        pixbuf keeps, so `data` does not need to outlive it.
+
+        Args:
+            data: A string with the RGBA pixels, 4 bytes per pixel.
+            size: The (width, height) of the image.
 
-        return pixbuf
+        Returns:
+            A GdkPixbuf object backed by a copy of `data`.
+        """
+        width, height = size
 
+        return GdkPixbuf.Pixbuf.new_from_bytes(
+            GLib.Bytes.new(data), GdkPixbuf.Colorspace.RGB, True, 8,
+            width, height, width * 4
+        )
 
     @classmethod
     def get_board_images(cls):
         if cls._BOARD_IMAGE and cls._BOARD_MASK_IMAGE:
             return cls._BOARD_IMAGE.copy(), cls._BOARD_MASK_IMAGE.copy()
 
+        cls._load_board_images()
+
+        return cls._BOARD_IMAGE.copy(), cls._BOARD_MASK_IMAGE.copy()
+
+    @classmethod
+    def _load_board_images(cls):
         board_image_path = cls.BOARD_IMAGE_PATH
 
         board_image = load_image(board_image_path)
         board_image_mask = load_image(get_mask_path(board_image_path), mode='L')
 
+        if not (board_image and board_image_mask):
+            return
+
         # Pixel offsets within the board_image to reach the LED matrix
 
         # Right and bottom margins for the board LED matrix, in pixels
@@ -128,73 +166,208 @@ class SimulationBoard(Board):
         cls._LED_IMAGE_WIDTH = w
         cls._LED_IMAGE_HEIGHT = h
 
-        return cls._BOARD_IMAGE.copy(), cls._BOARD_MASK_IMAGE.copy()
+    @classmethod
+    def create_compositor(cls, size=None):
+        """
+        Create a compositor which draws the LEDs of this board class on the
+        board image. Each stream of frames should use its own compositor, as
+        they only draw what changed since the previous frame they were given.
+
+        Args:
+            size: The (width, height) to draw the board at, defaults to the
+                  size of the board image.
+
+        Returns:
+            A BoardCompositor object or None if the board image is missing.
+        """
+        if not (cls._BOARD_IMAGE and cls._BOARD_MASK_IMAGE):
+            cls._load_board_images()
+
+        if not cls._BOARD_IMAGE:
+            return None
 
+        return BoardCompositor(*cls._get_board_layers(size))
 
     @classmethod
-    def board_from_image(cls, im):
+    def _get_board_layers(cls, size=None):
+        """
+        Get the board image, the LEDs mask, the offset and size of the LEDs
+        layer and the LED sprites, scaled to `size`. They are only scaled the
+        first time the board is drawn at a size.
+        """
+        size = tuple(size or cls._BOARD_IMAGE.size)
+        key = (cls.NAME, size)
+
+        layers = cls._BOARD_LAYERS.pop(key, None)
+        if not layers:
+            board_image = cls._BOARD_IMAGE.convert('RGBA')
+            board_mask = cls._BOARD_MASK_IMAGE
+            offset = (cls.H_OFFSET, cls.V_OFFSET)
+            layer_size = (cls._LED_IMAGE_WIDTH, cls._LED_IMAGE_HEIGHT)
+
+            if size != board_image.size:
+                x_scale = float(size[0]) / board_image.size[0]
+                y_scale = float(size[1]) / board_image.size[1]
+
+                offset = (
+                    int(round(offset[0] * x_scale)),
+                    int(round(offset[1] * y_scale))
+                )
+                layer_size = (
+                    int(round(layer_size[0] * x_scale)),
+                    int(round(layer_size[1] * y_scale))
+                )
+                board_image = board_image.resize(size, Image.ANTIALIAS)
+                board_mask = board_mask.resize(layer_size, Image.ANTIALIAS)
+
+            layers = (
+                board_image, board_mask, offset, layer_size, SpriteCache()
+            )
+
+        # Keep the most recently used sizes last and forget the oldest ones
+        cls._BOARD_LAYERS[key] = layers
+        while len(cls._BOARD_LAYERS) > cls._MAX_BOARD_LAYERS:
+            cls._BOARD_LAYERS.popitem(last=False)
+
+        return layers
+
+    @classmethod
+    def get_compositor(cls):
+        """
+        Get the compositor shared by the users of board_from_image() for this
+        board class. It is created the first time it is needed.
+        """
+        if not cls._COMPOSITOR:
+            cls._COMPOSITOR = cls.create_compositor()
+
+        return cls._COMPOSITOR
+
+    @classmethod
+    def board_from_image(cls, im, changed_box=None, compositor=None):
         """
         Get a PIL.Image.new of an image with the LEDs drawn on the board image.
 
+        Only the LEDs which changed since the previous call are drawn again,
+        see BoardCompositor.
+
         Args:
             im: A PIL.Image.new object containing a 14x9 pixels image with
                 alpha channel. Each non transpareny pixel represents a lit
                 LED on the board.
-            board_image_path: The fullpath to the board image to use.
+            changed_box: The box of `im` which changed since the previous image
+                         given to the compositor, or None if unknown.
+            compositor: The BoardCompositor to use, defaults to the one shared
+                        by this board class.
 
         Returns:
             A PIL.Image.new object with the LEDs drawn on the given board image.
         """
-        board_image, board_image_mask = cls.get_board_images()
-
-        # scale up the leds image to the size of the board
-        leds_layer = im.resize(
-            (cls._LED_IMAGE_WIDTH, cls._LED_IMAGE_HEIGHT),
-            Image.NEAREST
-        )
+        if not compositor:
+            compositor = cls.get_compositor()
+            changed_box = None
 
         # If board image image load fails, display a black background LED matrix
-        if not board_image:
-            return leds_layer
+        if not compositor:
+            return im.resize(cls.IMAGE_DIMENSIONS, Image.NEAREST)
 
-        # Create LED luminosity alpha mask
-        led_HSV_img = leds_layer.convert('HSV')
-        led_brightness_mask = led_HSV_img.split()[2]
+        return compositor.compose(im, changed_box)
 
-        # Clip LED luminosities to their shapes
-        led_mask = Image.new('L', leds_layer.size)
-        led_mask.paste(led_brightness_mask, None, mask=board_image_mask)
+    @staticmethod
+    def get_debug_recorder():
+        return DebugFrameRecorder.get_inst(os.path.join(TEMP_DIR, 'debug'))
 
-        # Compose coloured LEDs with their alpha masks
-        board_image.paste(leds_layer, (cls.H_OFFSET, cls.V_OFFSET),
-                          mask=led_mask)
+    def _send_debug_simulation(self):
+        # The frame is written in the background and only composed onto the
+        # board image if save_debug_frames() is called
+        self.get_debug_recorder().capture(self._board_lights_image)
 
-        return board_image
+    @classmethod
+    def save_debug_frames(cls):
+        """
+        Save the frames recorded for debugging as board images, in
+        TEMP_DIR/debug/t{n}.png
 
-    def _send_debug_simulation(self):
-        # update method sends the next image to where it's going
-        filename = self._debug_filename_template.format(self._count)
-        self._count += 1
-        board = self.board_from_image(
-            self._board_lights_image
-        )
-        board.save(filename)
-        chown_path(filename)
+        Returns:
+            The list of paths to the images.
+        """
+        return cls.get_debug_recorder().save_composed_frames(cls)
 
     def _send_simulation(self):
+        dirty_box = self._dirty_box
+        self._dirty_box = None
+
         if self.callback:
-            self.callback(self._board_lights_image)
+            self.callback(self._board_lights_image, dirty_box)
+
+    def _mark_dirty(self, box=None):
+        """
+        Record that a region of the LEDs image changed since the last frame.
+
+        Args:
+            box: The (left, top, right, bottom) box which changed, with the
+                 right and bottom edges excluded. Defaults to the whole image.
+        """
+        width, height = self._board_lights_image.size
+
+        if box is None:
+            box = (0, 0, width, height)
+        else:
+            left, top, right, bottom = box
+            box = (
+                max(0, int(left)), max(0, int(top)),
+                min(width, int(right)), min(height, int(bottom))
+            )
+            if box[0] >= box[2] or box[1] >= box[3]:
+                return
+
+        if self._dirty_box:
+            box = (
+                min(box[0], self._dirty_box[0]),
+                min(box[1], self._dirty_box[1]),
+                max(box[2], self._dirty_box[2]),
+                max(box[3], self._dirty_box[3])
+            )
+
+        self._dirty_box = box
+
+    def _draw(self, shape, fill):
+        """
+        Fill a shape drawn with ImageDraw on the LEDs and record the box it
+        covers as changed.
+
+        Args:
+            shape: A function which draws the shape with fill=255 on the
+                   ImageDraw.Draw object it is given, see Framebuffer.draw()
+            fill: The colour to fill the shape with.
+        """
+        box = self._framebuffer.draw(shape, fill)
+        if box:
+            self._mark_dirty(box)
 
     def _update(self):
+        # Give the user code a chance to stop, even if it never sleeps
+        CodeThread.check_current()
+
+        if self._batch_depth:
+            self._batch_pending = True
+            return
+
+        self._send_frame()
+
+    def _send_frame(self):
         if self._debug:
             self._send_debug_simulation()
 
         self._send_simulation()
 
+    def _end_batch(self):
+        if self._batch_pending:
+            self._batch_pending = False
+            self._send_frame()
+
     def clear(self):
-        self._board_lights_draw.rectangle(
-            ((0, 0), self.IMAGE_DIMENSIONS), fill=__builtins__['black']
-        )
+        self._framebuffer.fill(BLACK)
+        self._mark_dirty()
 
         self._update()
 
@@ -0,0 +1,164 @@
+# sprite.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Bitmaps which are drawn on the boards in one go with light.blit()
+
+import numpy as np
+from PIL import Image
+
+from make_light.boards.base.colours.colour_palette import ColourPalette
+
+
+class Sprite(object):
+    """
+    A small picture of LEDs, with transparent parts, which is built once and
+    then drawn anywhere on a board with light.blit(sprite, where).
+
+    The pixels of the sprite are kept for each framebuffer format and colour
+    it is drawn in, so drawing it again is a single copy.
+    """
+
+    TRANSPARENT = ' .'
+
+    def __init__(self, colours, mask=None):
+        """
+        :param colours: Array of (height, width, 3) RGB colours
+        :type colours: numpy.ndarray
+        :param mask: Boolean array of (height, width) set where the sprite is
+                     drawn, defaults to the whole sprite
+        :type mask: numpy.ndarray
+        """
+        self.colours = np.asarray(colours, dtype=np.uint8)
+
+        if mask is None:
+            mask = np.ones(self.colours.shape[:2], dtype=bool)
+        self.mask = np.asarray(mask, dtype=bool)
+
+        self._pixels = {}
+
+    @property
+    def size(self):
+        return self.mask.shape[1], self.mask.shape[0]
+
+    @classmethod
+    def from_string(cls, rows, colour=(255, 255, 255), palette=None):
+        """
+        Build a sprite from a grid of characters, e.g.
+
+            Sprite.from_string('''
+                .XX.
+                X..X
+                .XX.
+            ''')
+
+        Spaces and dots are transparent. The other characters are drawn in
+        `colour`, unless they are given their own colour in `palette`.
+
+        :param rows: The rows of the sprite, as lines of a string or a list
+        :type rows: str or list of str
+        :param palette: Colours of the characters, e.g. {'R': 'red'}
+        :type palette: dict
+        """
+        if isinstance(rows, basestring):
+            rows = [row.strip() for row in rows.splitlines()]
+            rows = [row for row in rows if row]
+
+        palette = dict(
+            (char, cls._get_rgb(value))
+            for char, value in (palette or {}).iteritems()
+        )
+        colour = cls._get_rgb(colour)
+
+        width = max(len(row) for row in rows) if rows else 0
+        colours = np.zeros((len(rows), width, 3), dtype=np.uint8)
+        mask = np.zeros((len(rows), width), dtype=bool)
+
+        for y, row in enumerate(rows):
+            for x, char in enumerate(row):
+                if char in cls.TRANSPARENT:
+                    continue
+
+                colours[y, x] = palette.get(char, colour)
+                mask[y, x] = True
+
+        return cls(colours, mask)
+
+    @classmethod
+    def from_image(cls, image):
+        """
+        Build a sprite from an image, with one pixel for each LED. Its fully
+        transparent pixels are transparent in the sprite.
+
+        :param image: Path to the image file or the image itself
+        :type image: str or PIL.Image.Image
+        """
+        if isinstance(image, basestring):
+            image = Image.open(image)
+
+        pixels = np.asarray(image.convert('RGBA'))
+
+        return cls(pixels[..., :3], pixels[..., 3] > 0)
+
+    @classmethod
+    def from_framebuffer(cls, framebuffer, box):
+        """
+        Build a sprite from a region of what was drawn on a board. The LEDs
+        which are off are transparent in the sprite.
+
+        :param framebuffer: The Framebuffer of the board
+        :type framebuffer: Framebuffer
+        :param box: The (left, top, right, bottom) region to copy
+        :type box: tuple
+        """
+        left, top, right, bottom = box
+        pixels = framebuffer.pixels[top:bottom, left:right]
+
+        if framebuffer.channels == 1:
+            colours = np.repeat(pixels, 3, axis=2)
+        else:
+            colours = pixels[..., :3]
+
+        return cls(colours.copy(), colours.any(axis=2))
+
+    def get_pixels(self, channels, colour=None):
+        """
+        Get the pixels of the sprite in the format of a framebuffer.
+
+        :param channels: Number of channels of the framebuffer, 1 is the
+                         brightness of the colours and 4 adds an opaque alpha
+        :type channels: int
+        :param colour: RGB colour to draw the whole sprite in, defaults to the
+                       colours of the sprite
+        :type colour: tuple
+        :returns: Array of (height, width, channels) pixels
+        :rtype: numpy.ndarray
+        """
+        key = (channels, colour)
+        pixels = self._pixels.get(key)
+
+        if pixels is None:
+            colours = self.colours
+            if colour is not None:
+                colours = np.empty_like(colours)
+                colours[...] = colour
+
+            if channels == 1:
+                pixels = colours.max(axis=2)[..., np.newaxis]
+            elif channels == 4:
+                alpha = np.full(self.mask.shape + (1,), 255, dtype=np.uint8)
+                pixels = np.concatenate((colours, alpha), axis=2)
+            else:
+                pixels = colours
+
+            self._pixels[key] = pixels
+
+        return pixels
+
+    @staticmethod
+    def _get_rgb(colour):
+        if isinstance(colour, basestring):
+            return ColourPalette._get_rgb(colour)
+
+        return tuple(int(channel) for channel in colour)
@@ -0,0 +1,201 @@
+# timeline.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Animations made of keyframes, worked out once and played with light.frame()
+
+import time
+
+import numpy as np
+
+
+def _ease_in(progress):
+    return progress ** 2
+
+
+def _ease_out(progress):
+    return 1 - (1 - progress) ** 2
+
+
+def _ease_in_out(progress):
+    return np.where(
+        progress < 0.5, 2 * progress ** 2, 1 - 2 * (1 - progress) ** 2
+    )
+
+
+class Timeline(object):
+    """
+    An animation of a board, made of keyframes. The LEDs fade from each
+    keyframe to the next one, e.g.
+
+        timeline = Timeline(light, fps=20)
+        timeline.key(0, [red] * 10)
+        timeline.key(2, [blue] * 10, ease='ease_in_out')
+        timeline.play(loops=3)
+
+    All the frames are worked out in one go, into an array of the colours of
+    the LEDs in each frame, the first time the timeline is played. Playing it
+    only sends the frames which changed to the board with light.frame(), at a
+    fixed rate.
+    """
+
+    # How the LEDs go from one keyframe to the next, as a function of the
+    # fraction of the time between them
+    EASINGS = {
+        'linear': lambda progress: progress,
+        'step': np.floor,
+        'ease_in': _ease_in,
+        'ease_out': _ease_out,
+        'ease_in_out': _ease_in_out,
+    }
+
+    def __init__(self, board, fps=20):
+        """
+        :param board: The board the animation is played on
+        :type board: Board
+        :param fps: Number of frames per second
+        :type fps: float
+        """
+        self.board = board
+        self.fps = float(fps)
+
+        # (time, colours, easing) of each keyframe, by time
+        self._keys = []
+
+        self._frames = None
+        self._changed = None
+
+    @property
+    def duration(self):
+        """ The time of the last keyframe, in seconds """
+        return self._keys[-1][0] if self._keys else 0
+
+    def key(self, when, frame, ease='linear'):
+        """
+        Add a keyframe, replacing any other one at the same time.
+
+        :param when: The time of the keyframe, in seconds from the start
+        :type when: float
+        :param frame: The colours of the LEDs, in any form light.frame()
+                      takes, e.g. a list of a colour for each LED
+        :param ease: How the LEDs go from the previous keyframe to this one,
+                     see EASINGS
+        :type ease: str
+        :returns: The timeline, so keyframes can be chained
+        :raises ValueError: if the frame is not the size of the board or the
+                            easing is unknown
+        """
+        if ease not in self.EASINGS:
+            raise ValueError('Unknown easing {!r}, use one of {}'.format(
+                ease, ', '.join(sorted(self.EASINGS))
+            ))
+
+        colours = np.array(self.board._parse_frame(frame), dtype=np.uint8)
+
+        self._keys = [key for key in self._keys if key[0] != when]
+        self._keys.append((when, colours, ease))
+        self._keys.sort(key=lambda key: key[0])
+
+        self._frames = None
+
+        return self
+
+    def sequence(self, frames, start=None, repeat=1):
+        """
+        Add frames shown one after the other, each for one frame of the
+        timeline, e.g. the frames of a sprite animation.
+
+        :param frames: The frames, in any form light.frame() takes
+        :type frames: list
+        :param start: The time of the first frame, defaults to one frame
+                      after the last keyframe
+        :type start: float
+        :param repeat: Number of times the frames are added
+        :type repeat: int
+        :returns: The timeline, so keyframes can be chained
+        """
+        if start is None:
+            start = self.duration + 1 / self.fps if self._keys else 0
+
+        for idx, frame in enumerate(list(frames) * repeat):
+            self.key(start + idx / self.fps, frame, ease='step')
+
+        return self
+
+    def render(self):
+        """
+        Work out all the frames of the animation, unless they were already.
+
+        :returns: Array of (frames, LEDs, 3) uint8 colours
+        :rtype: numpy.ndarray
+        """
+        if self._frames is not None:
+            return self._frames
+
+        if not self._keys:
+            raise ValueError('The timeline has no keyframes')
+
+        # The keyframes are placed in frame numbers, rounded so that the
+        # frames of a sequence land on their frame
+        keys = [
+            (round(when * self.fps, 6), colours, ease)
+            for when, colours, ease in self._keys
+        ]
+
+        frame_count = int(round(keys[-1][0])) + 1
+        times = np.arange(frame_count)
+        frames = np.empty((frame_count,) + keys[0][1].shape, dtype=np.uint8)
+
+        # The LEDs stay as they are in the first and last keyframes before
+        # and after them
+        frames[times < keys[0][0]] = keys[0][1]
+        frames[times >= keys[-1][0]] = keys[-1][1]
+
+        for (start, start_colours, dummy), (end, end_colours, ease) in zip(
+                keys, keys[1:]):
+            in_tween = (times >= start) & (times < end)
+            if not in_tween.any():
+                continue
+
+            progress = self.EASINGS[ease](
+                (times[in_tween] - start) / (end - start)
+            )
+            start_colours = start_colours.astype(float)
+            change = end_colours - start_colours
+
+            frames[in_tween] = np.rint(
+                start_colours + progress[:, np.newaxis, np.newaxis] * change
+            )
+
+        self._frames = frames
+        self._changed = np.ones(frame_count, dtype=bool)
+        self._changed[1:] = (frames[1:] != frames[:-1]).any(axis=(1, 2))
+
+        return frames
+
+    def play(self, loops=1):
+        """
+        Play the animation on the board.
+
+        :param loops: Number of times it is played, or None to play it again
+                      and again
+        :type loops: int
+        """
+        frames = self.render()
+        changed = self._changed
+
+        loop = 0
+        while loops is None or loop < loops:
+            start = time.time()
+
+            for idx, frame in enumerate(frames):
+                # The first frame is always drawn, as the board may have
+                # changed since the last one
+                if changed[idx] or idx == 0:
+                    self.board.frame(frame)
+
+                delay = start + (idx + 1) / self.fps - time.time()
+                time.sleep(max(0, delay))
+
+            loop += 1
@@ -16,6 +16,8 @@ from make_light.boards.router.runners.lightboard_runner_local import \
 from make_light.boards.router.runners.lightboard_runner_ethernet import \
     LightBoardRunnerEthernet
 from make_light.boards.router.runners.simulation_runner import SimulationRunner
+from make_light.boards.router.runners.in_process_simulation_runner import \
+    InProcessSimulationRunner
 from make_light.boards.available_boards import AVAILABLE_BOARDS
 
 
@@ -57,7 +59,8 @@ class BoardRouter(GObject.GObject):
     }
 
     def __init__(self, board_name, simulation_enabled=True,
-                 run_locally=True, run_remotely=False):
+                 run_locally=True, run_remotely=False,
+                 in_process_simulation=False):
         GObject.GObject.__init__(self)
 
         self.board = None
@@ -70,6 +73,10 @@ class BoardRouter(GObject.GObject):
         self.run_locally = run_locally
         self.run_remotely = run_remotely
 
+        # Draw the simulator in the app instead of embedding a separate GTK
+        # process, see create_animation_socket()
+        self.in_process_simulation = in_process_simulation
+
         self._simulation_runner = \
             self._local_runner = \
             self._remote_runner = LightBoardRunner(self.board)
@@ -150,19 +157,53 @@ class BoardRouter(GObject.GObject):
         self._destroy_runner(self._local_runner)
         self._destroy_runner(self._remote_runner)
 
+    def create_animation_socket(self):
+        """ Create the widget in which the simulator is shown, to be given to
+        set_animation_socket()
+
+        :returns: A SimulationView, which the app draws itself, when
+                  `in_process_simulation` is set. Otherwise a Gtk.Socket, in
+                  which the simulator process embeds its window.
+        :rtype: Gtk.Widget
+        """
+        if self.in_process_simulation:
+            from make_light.boards.router.runners.simulation_view import \
+                SimulationView
+            return SimulationView()
+
+        from gi.repository import Gtk
+        return Gtk.Socket()
+
     def set_animation_socket(self, anim_socket):
+        """ Set the widget in which the simulator is shown and create the
+        simulation runner for it
+
+        The simulator process which was running in the previous widget is
+        moved to the new one when it is for the same board and of the same
+        kind, rather than started again.
+
+        :param anim_socket: A Gtk.Socket for the simulator to embed its window
+                            into, or a SimulationView to draw the simulator in
+                            this process (see create_animation_socket)
+        :type anim_socket: Gtk.Widget
+        """
         if not self.simulation_enabled:
             return
 
         self._anim_socket = anim_socket
+        runner = self._simulation_runner
 
         if self._simulation_launched:
-            if self._simulation_runner.is_running():
-                try:
-                    self._simulation_runner.destroy()
-                except OSError:
-                    # We get this if this process is already terminated
-                    pass
+            if (runner.board is self.board and
+                    type(runner) is self._get_simulation_runner_class()):
+                runner.set_anim_socket(anim_socket)
+                return
+
+            try:
+                runner.destroy()
+            except OSError:
+                # We get this if this process is already terminated
+                pass
 
         self._create_simulation_runner()
 
@@ -175,11 +216,19 @@ class BoardRouter(GObject.GObject):
         else:
             return board['simulation_board']()
 
+    def _get_simulation_runner_class(self):
+        # Only the in-process simulator draws in a widget of its own
+        if hasattr(self._anim_socket, 'attach_framebuffer'):
+            return InProcessSimulationRunner
+
+        return SimulationRunner
+
     def _create_simulation_runner(self):
         if not self._anim_socket:
             raise ValueError('A valid animation socket is required')
 
-        self._simulation_runner = runner = SimulationRunner(
+        runner_class = self._get_simulation_runner_class()
+        self._simulation_runner = runner = runner_class(
             self.board, self._anim_socket
         )
         runner.connect('finished-run', self._on_finished_run)
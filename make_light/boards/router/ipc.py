@@ -7,11 +7,131 @@
 # TODO: Move more IPC into here
 
 
+import os
+import mmap
+import struct
 from os import remove
 from os.path import exists
 
+from PIL import Image
+
 from make_light.paths import SIM_PIPE
 
 def remove_pipe():
     if exists(SIM_PIPE):
         remove(SIM_PIPE)
+
+
+class SharedFramebuffer(object):
+    """
+    The LEDs image of a board in a memory mapped file, which one process
+    writes frames to and another one reads them from.
+
+    The header holds a sequence counter, the size of the image and the box
+    which changed since the previous frame. The counter is odd while a frame
+    is being written, so that a reader can tell when it copied half a frame.
+    """
+
+    HEADER = struct.Struct('<QHHHHHH')
+    HEADER_SIZE = 32
+    MODE = 'RGBA'
+
+    def __init__(self, path, size=None):
+        """
+        Open the framebuffer in the file at `path`.
+
+        Args:
+            path: The path to the file shared by the processes.
+            size: The (width, height) of the frames. When it is given, a new
+                  framebuffer is created for writing, otherwise the existing
+                  one is opened for reading.
+        """
+        self.path = path
+        self._seq = 0
+
+        if size:
+            # Readers which still map the previous file are left with it
+            if exists(path):
+                remove(path)
+
+            with open(path, 'w+b') as fb_file:
+                fb_file.truncate(
+                    self.HEADER_SIZE + size[0] * size[1] * len(self.MODE)
+                )
+
+            fd = os.open(path, os.O_RDWR)
+            access = mmap.ACCESS_WRITE
+        else:
+            fd = os.open(path, os.O_RDONLY)
+            access = mmap.ACCESS_READ
+
+        try:
+            self._map = mmap.mmap(fd, 0, access=access)
+        finally:
+            os.close(fd)
+
+        if size:
+            self.HEADER.pack_into(self._map, 0, 0, *(size + (0, 0) + size))
+
+        self.size = self.HEADER.unpack_from(self._map)[1:3]
+        self._row_size = self.size[0] * len(self.MODE)
+
+    def write(self, im, dirty_box=None):
+        """
+        Publish a frame. Only the rows within `dirty_box` are copied.
+
+        Args:
+            im: A PIL.Image.new object of the size of the framebuffer.
+            dirty_box: The (left, top, right, bottom) box of `im` which changed
+                       since the previous frame, defaults to the whole image.
+        """
+        width, height = self.size
+        if not dirty_box:
+            dirty_box = (0, 0, width, height)
+
+        if im.mode != self.MODE:
+            im = im.convert(self.MODE)
+
+        top, bottom = dirty_box[1], dirty_box[3]
+        start = self.HEADER_SIZE + top * self._row_size
+        end = self.HEADER_SIZE + bottom * self._row_size
+
+        self._seq += 1
+        self.HEADER.pack_into(self._map, 0, self._seq, width, height,
+                              *dirty_box)
+
+        self._map[start:end] = im.crop((0, top, width, bottom)).tobytes()
+
+        self._seq += 1
+        self.HEADER.pack_into(self._map, 0, self._seq, width, height,
+                              *dirty_box)
+
+    def read(self, last_seq=None):
+        """
+        Get the latest frame, unless it was already read.
+
+        Args:
+            last_seq: The sequence number of the last frame read.
+
+        Returns:
+            A tuple with the sequence number, a PIL.Image.new object with the
+            frame and the box which changed since the frame `last_seq`, which
+            is None when it is unknown. None when there is no new frame or it
+            is being written.
+        """
+        seq = self.HEADER.unpack_from(self._map)[0]
+        if seq % 2 or seq == last_seq:
+            return None
+
+        data = self._map[self.HEADER_SIZE:]
+        header = self.HEADER.unpack_from(self._map)
+        if header[0] != seq:
+            return None
+
+        # The box only covers the changes since the frame just before
+        dirty_box = header[3:] if last_seq == seq - 2 else None
+
+        return seq, Image.frombytes(self.MODE, self.size, data), dirty_box
+
+    def close(self):
+        self._map.close()
@@ -10,13 +10,18 @@
 # one process into another process in a fashion that is transparent to the user:
 #
 # https://developer.gnome.org/gtk3/stable/GtkPlug.html
+#
+# By default the user code doesn't run in this process but in code_process.py,
+# started by the plug, which writes the frames to a SharedFramebuffer. The
+# user code and the drawing of the simulator then don't compete for the GIL.
 
 
 import os
 import sys
-import imp
 import json
+import time
 import threading
+import subprocess
 
 from gi.repository import Gtk, GObject
 
@@ -25,10 +30,12 @@ from kano.logging import logger
 logger.force_debug_level(None)
 
 from make_light.gif.gif_recorder import GifRecorder
-from make_light.paths import GIF_FRAMES_DIR, TEMP_DIR
+from make_light.paths import GIF_FRAMES_DIR, SIM_FRAMEBUFFER
 from make_light.boards.router import BOARD_ROUTER
-
-from make_light.paths import SIM_PIPE
+from make_light.boards.router.runners.user_code import run_user_code
+from make_light.boards.base.code_thread import CodeThread, \
+    install_cancellable_sleep
+from make_light.boards.router.runners.simulation_view import SimulationView
 
 # Multithread Gtk protection
 GObject.threads_init()
@@ -40,13 +47,31 @@ class AnimationPlug(Gtk.Plug):
     to display the animation - this is the simulator window
     """
 
-    def __init__(self, board, plug_id, debug=False):
+    def __init__(self, board, plug_id, debug=False, display_rate=None,
+                 code_process=True):
         Gtk.Plug.__init__(self)
 
         self.board = board
         self.debug = debug
+        self._display_rate = display_rate
+
+        # Frames sent by the user code are left in a mailbox, where each new
+        # frame replaces the one before it, until the GTK thread shows it
+        self._frame_interval = 1.0 / (
+            display_rate or SimulationView.DISPLAY_RATE
+        )
+        self._frame_lock = threading.Lock()
+        self._pending_frame = None
+        self._pending_box = None
+        self._update_scheduled = False
+        self._last_update = 0
 
         self.gif_recorder = GifRecorder(GIF_FRAMES_DIR)
+        self.user_code_thread = None
+
+        # Process running the user code, when it doesn't run in this process
+        self.code_process = None
+        self._quitting = False
 
         # PLUG_ID Is the window ID of the widget on the remote app,
         # on which we are allowed to work on - the Simulator image box.
@@ -60,52 +85,112 @@ class AnimationPlug(Gtk.Plug):
         # FIXME: simulator box image is decorated?
         self.set_decorated(True)
 
-        # Create an image widget to display the animation
-        self.image = Gtk.Image.new_from_file(board.BOARD_IMAGE_PATH)
+        # Create a drawing area to display the animation
+        self.image = SimulationView(board)
 
         self.connect('map-event', self.mapped)
-        self.connect('delete-event', Gtk.main_quit)
+        self.connect('delete-event', self._on_delete_event)
+        self.connect('notify::embedded', self._on_embedded_changed)
         self.connect('realize', self._on_realize)
 
         # And insert the image widget into the remote one (gtk.box)
         self.add(self.image)
         self.show_all()
 
+        if code_process:
+            self._start_code_process()
+
+    def _start_code_process(self):
+        """
+        Start the process which runs the user code. The commands of the app
+        are passed on to it and its replies are passed back to the app
+        """
+        script_path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), 'code_process.py'
+        )
+        command = ['python', script_path, 'debug' if self.debug else '']
+
+        new_env = os.environ.copy()
+        new_env['FRAMEBUFFER'] = SIM_FRAMEBUFFER
+
+        self.code_process = subprocess.Popen(
+            command,
+            env=new_env,
+            bufsize=1,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+
+        code_output_thread = threading.Thread(
+            target=self.thr_code_process_output, args=(self.code_process,)
+        )
+        code_output_thread.daemon = True
+        code_output_thread.start()
+
+    def thr_code_process_output(self, code_process):
+        """
+        Background thread which passes the replies of the code process on to
+        the app
+        """
+        for line in iter(code_process.stdout.readline, ''):
+            reply = line.strip('\n')
+
+            if reply == 'LOADING-COMPLETE':
+                # The app is told when the plug is loaded instead
+                GObject.idle_add(
+                    self.image.attach_framebuffer, SIM_FRAMEBUFFER,
+                    self._display_rate
+                )
+                continue
+
+            if reply == 'ANIMATION-NOT-STOPPED':
+                # The user code is stuck, only its process is started again
+                code_process.kill()
+                continue
+
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+        code_process.wait()
+        self._debug_('code process ended')
+
+        if code_process is self.code_process and not self._quitting:
+            # The user code was stuck or took its process down, e.g. with
+            # os._exit(), so it is finished and a new process is started
+            sys.stdout.write('ANIMATION-FINISHED\n')
+            sys.stdout.flush()
+            GObject.idle_add(self._start_code_process)
+
     def _on_realize(self, widget=None):
+        # The app embeds this window again in the sockets of the next views
+        sys.stdout.write('PLUG-WINDOW {}\n'.format(self.get_id()))
         sys.stdout.write('LOADING-COMPLETE\n')
         sys.stdout.flush()
 
+    def _on_delete_event(self, widget=None, event=None):
+        """
+        The socket of the plug went away with the view it was in. The plug is
+        kept hidden until the app embeds it in a new socket, so that moving
+        between views doesn't start a new simulator
+        """
+        self._debug_('socket removed, waiting to be embedded again')
+        self.hide()
+        return True
+
+    def _on_embedded_changed(self, widget=None, param=None):
+        if self.get_embedded():
+            self.show_all()
+
     def thr_user_code_module(self):
         """
         This thread loads the code written by the user
         And renders the LEDs on top of the simulation board
         which is displayed in the simulator widget on the main app
 
-        A function pass-through (imp) loads the user code as an embedded module
+        See run_user_code()
         """
         self._debug_('thr_user_code_module starts')
-        try:
-            self.board.all(False)
-            imp.load_source("top", os.path.join(TEMP_DIR, "powerup-code-all.py"))
-        except:
-            import traceback
-            error_text = traceback.format_exc().encode('string_escape')
-
-            sys.stderr.write(error_text + '\n')
-            sys.stderr.flush()
-
-            sys.stdout.write('SCRIPT-ENCOUNTERED-ERROR\n')
-            sys.stdout.flush()
-
-            with open(SIM_PIPE, "w") as f:
-                f.write(error_text + '\n')
-                f.flush()
-
-        else:
-            # Send an ACKnowledge to the app that the animation has finished
-            sys.stdout.write('ANIMATION-FINISHED\n')
-            sys.stdout.flush()
-
+        run_user_code(self.board)
         self._debug_('thr_user_code_module ends')
 
     def thr_stdin_commands(self):
@@ -121,13 +206,26 @@ class AnimationPlug(Gtk.Plug):
                 # QUIT-ANIMATION command is sent
                 pass
             else:
+                if not line:
+                    # The app is gone, without sending QUIT-ANIMATION
+                    GObject.idle_add(self._quit_animation_process)
+                    break
+
                 self._debug_('Stdin Command received: {}'.format(line))
 
                 command = line.strip('\n')
-                if command == 'START-ANIMATION':
+                if self.code_process and command in (
+                        'START-ANIMATION', 'STOP-ANIMATION', 'SAVE-ANIMATION'):
+                    self._send_to_code_process(line)
+
+                elif command == 'START-ANIMATION':
                     # Start the animation thread
                     GObject.idle_add(self._launch_animation_thread)
 
+                elif command == 'STOP-ANIMATION':
+                    # Waiting for the user code to stop would block the UI
+                    self._stop_animation()
+
                 elif command == 'SAVE-ANIMATION':
                     GObject.idle_add(self._save_animation)
 
@@ -137,14 +235,29 @@ class AnimationPlug(Gtk.Plug):
                 else:
                     self._debug_('Stdin Command unknown')
 
+    def _send_to_code_process(self, line):
+        try:
+            self.code_process.stdin.write(line)
+            self.code_process.stdin.flush()
+        except IOError:
+            # The process is being started again
+            self._debug_('Code process is gone, command dropped')
+
     def _launch_animation_thread(self):
         self.gif_recorder.reset()
 
         # This is the thread that will run the user code
-        self.user_code_thread = threading.Thread(target=self.thr_user_code_module)
-        self.user_code_thread.daemon = True
+        self.user_code_thread = CodeThread(target=self.thr_user_code_module)
         self.user_code_thread.start()
 
+    def _stop_animation(self):
+        thread = self.user_code_thread
+        if thread and thread.is_alive() and not thread.cancel():
+            # The user code is stuck, e.g. in a system call, so the app has
+            # to restart this process
+            sys.stdout.write('ANIMATION-NOT-STOPPED\n')
+            sys.stdout.flush()
+
     def _save_animation(self):
         error = self.gif_recorder.save_frames()
         if error:
@@ -159,20 +272,66 @@ class AnimationPlug(Gtk.Plug):
 
     def _quit_animation_process(self):
         self._debug_('Terminating the simulator process')
+        self._quitting = True
+
+        if self.code_process and self.code_process.poll() is None:
+            self._send_to_code_process('QUIT-ANIMATION\n')
+
         Gtk.main_quit()
 
-    def set_image(self, im):
+    def set_image(self, im, dirty_box=None):
         """
         Render the next simulated image into the remote widget
+
+        The frame replaces any frame which was not shown yet and is shown at
+        most DISPLAY_RATE times per second. `dirty_box` is the box of the LEDs
+        image which changed since the previous frame, it is merged with those
+        of the frames that were replaced.
         """
         self._debug_('called: set_image')
-        self.pb = self.board.compose_image(im)
         self.gif_recorder.buffer_frame(im)
-        GObject.idle_add(self.update)
+
+        with self._frame_lock:
+            if self._pending_frame is None:
+                self._pending_box = dirty_box
+            elif self._pending_box and dirty_box:
+                self._pending_box = (
+                    min(self._pending_box[0], dirty_box[0]),
+                    min(self._pending_box[1], dirty_box[1]),
+                    max(self._pending_box[2], dirty_box[2]),
+                    max(self._pending_box[3], dirty_box[3])
+                )
+            else:
+                self._pending_box = None
+
+            self._pending_frame = im.copy()
+
+            if self._update_scheduled:
+                return
+
+            self._update_scheduled = True
+
+        delay = self._last_update + self._frame_interval - time.time()
+        GObject.timeout_add(max(0, int(delay * 1000)), self.update)
 
     def update(self):
+        """
+        Show the latest frame sent by the user code. Only the region of the
+        board which changed is composed and copied onto the displayed board,
+        then only that region of the widget is redrawn
+        """
         self._debug_('called: update')
-        self.image.set_from_pixbuf(self.pb)
+
+        with self._frame_lock:
+            im, dirty_box = self._pending_frame, self._pending_box
+            self._pending_frame = self._pending_box = None
+            self._update_scheduled = False
+
+        self._last_update = time.time()
+
+        self.image.show_frame(im, dirty_box)
+
+        return False
 
     def mapped(self, widget, event):
         # FIXME: We do not need this anymore,
@@ -188,12 +347,19 @@ class AnimationPlug(Gtk.Plug):
             logger.debug(message)
 
 
-def main(board, plug_id, debug=True):
-    animation_plug = AnimationPlug(board=board, plug_id=plug_id, debug=debug)
+def main(board, plug_id, debug=True, display_rate=None, code_process=True):
+    animation_plug = AnimationPlug(board=board, plug_id=plug_id, debug=debug,
+                                   display_rate=display_rate,
+                                   code_process=code_process)
+
+    if not code_process:
+        install_cancellable_sleep()
+
+        # the callback will be called by Gtk whenever the image needs be
+        # rendered
+        animation_plug._debug_('setting callback from function')
+        board.set_callback(animation_plug.set_image)
 
-    # the callback will be called by Gtk whenever the image needs be rendered
-    animation_plug._debug_('setting callback from function')
-    board.set_callback(animation_plug.set_image)
     animation_plug._debug_('launching GTK')
     Gtk.main()
 
@@ -212,5 +378,8 @@ if __name__ == "__main__":
     BOARD_ROUTER.change_board(BOARD_NAME)
     BOARD = BOARD_ROUTER.board
     PLUG_ID = int(os.environ["PLUG_ID"])
+    DISPLAY_RATE = float(os.environ.get('DISPLAY_RATE', 0)) or None
+    # CODE_PROCESS=0 runs the user code in a thread of this process instead
+    CODE_PROCESS = os.environ.get('CODE_PROCESS', '1') != '0'
 
-    main(BOARD, PLUG_ID, DEBUG)
+    main(BOARD, PLUG_ID, DEBUG, DISPLAY_RATE, CODE_PROCESS)
@@ -0,0 +1,166 @@
+# code_process.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Runs the user code for the simulator drawn by the app itself
+#
+# This module is executed via Popen from InProcessSimulationRunner. Unlike
+# animation_plug.py it has no window and doesn't load GTK: the frames of the
+# board are written to a SharedFramebuffer which a SimulationView in the app
+# draws. The user code stays in this process, so it can't block the UI.
+#
+# With LOOK_AHEAD set to a number of seconds, the user code runs ahead on a
+# VirtualClock and its frames are shown at their times by a FramePlayer, so
+# the speed of the animation doesn't depend on the speed of the user code.
+
+
+import os
+import sys
+import json
+
+from kano.logging import logger
+
+logger.force_debug_level(None)
+
+from make_light.gif.gif_recorder import GifRecorder
+from make_light.paths import GIF_FRAMES_DIR
+from make_light.boards.router import BOARD_ROUTER
+from make_light.boards.router.ipc import SharedFramebuffer
+from make_light.boards.router.runners.user_code import run_user_code
+from make_light.boards.router.runners.frame_player import FramePlayer
+from make_light.boards.base.code_thread import CodeThread, VirtualClock, \
+    install_cancellable_sleep, install_virtual_clock
+
+
+class CodeProcess(object):
+    """
+    CodeProcess runs the user code on a simulation board and publishes the
+    frames it draws to a shared framebuffer
+    """
+
+    def __init__(self, board, framebuffer_path, debug=False, look_ahead=None):
+        self.board = board
+        self.debug = debug
+
+        self.gif_recorder = GifRecorder(GIF_FRAMES_DIR)
+        self.framebuffer = SharedFramebuffer(
+            framebuffer_path, board._board_lights_image.size
+        )
+
+        self.user_code_thread = None
+
+        # Playback of the frames at the time of the clock of the user code
+        if look_ahead:
+            self.clock = VirtualClock(look_ahead)
+            self.player = FramePlayer(self.framebuffer.write)
+        else:
+            self.clock = None
+            self.player = None
+
+    def run(self):
+        """
+        Listen for commands through stdin to play / stop animations, until the
+        app asks this process to quit
+        """
+        sys.stdout.write('LOADING-COMPLETE\n')
+        sys.stdout.flush()
+
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                # The app closed the pipe without sending QUIT-ANIMATION
+                break
+
+            self._debug_('Stdin Command received: {}'.format(line))
+
+            command = line.strip('\n')
+            if command == 'START-ANIMATION':
+                self._launch_animation_thread()
+
+            elif command == 'STOP-ANIMATION':
+                self._stop_animation()
+
+            elif command == 'SAVE-ANIMATION':
+                self._save_animation()
+
+            elif command == 'QUIT-ANIMATION':
+                break
+
+            else:
+                self._debug_('Stdin Command unknown')
+
+        self._debug_('Terminating the simulator process')
+        self.framebuffer.close()
+
+    def _launch_animation_thread(self):
+        self.gif_recorder.reset()
+
+        if self.clock:
+            self.clock.reset()
+
+        # This is the thread that will run the user code
+        self.user_code_thread = CodeThread(
+            target=run_user_code, args=(self.board, self.player),
+            clock=self.clock
+        )
+        self.user_code_thread.start()
+
+    def _stop_animation(self):
+        thread = self.user_code_thread
+        if thread and thread.is_alive() and not thread.cancel():
+            # The user code is stuck, e.g. in a system call, so the app has
+            # to restart this process
+            sys.stdout.write('ANIMATION-NOT-STOPPED\n')
+            sys.stdout.flush()
+
+    def _save_animation(self):
+        error = self.gif_recorder.save_frames()
+        if error:
+            # Send the serialized ERROR back to the Runner process
+            error_str = json.dumps(error)
+            sys.stdout.write(error_str + '\n')
+        else:
+            # Send an ACKnowledge to the app that the animation was saved
+            sys.stdout.write('ANIMATION-SAVED\n')
+
+        sys.stdout.flush()
+
+    def set_image(self, im, dirty_box=None):
+        """
+        Publish the next simulated image to the app
+        """
+        self.gif_recorder.buffer_frame(im)
+
+        if self.player:
+            self.player.put(self.clock.now(), im, dirty_box)
+        else:
+            self.framebuffer.write(im, dirty_box)
+
+    def _debug_(self, message):
+        if self.debug:
+            logger.debug(message)
+
+
+def main(board, framebuffer_path, debug=False, look_ahead=None):
+    install_cancellable_sleep()
+    if look_ahead:
+        install_virtual_clock()
+
+    code_process = CodeProcess(board, framebuffer_path, debug=debug,
+                               look_ahead=look_ahead)
+    board.set_callback(code_process.set_image)
+    code_process.run()
+
+
+if __name__ == "__main__":
+    """
+    We are being executed from a remote process - the main Make Light app
+    """
+    DEBUG = len(sys.argv) > 1 and sys.argv[1] == 'debug'
+
+    BOARD_ROUTER.change_board(os.environ['BOARD'])
+
+    LOOK_AHEAD = float(os.environ.get('LOOK_AHEAD', 0)) or None
+
+    main(BOARD_ROUTER.board, os.environ['FRAMEBUFFER'], DEBUG, LOOK_AHEAD)
@@ -0,0 +1,118 @@
+# frame_player.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Shows the frames drawn ahead by the user code at the right time
+
+
+import time
+import threading
+from collections import deque
+
+from make_light.boards.base.code_thread import CodeThread
+
+
+class FramePlayer(object):
+    """
+    FramePlayer keeps the frames drawn by user code running on a VirtualClock
+    and shows each of them when the wall clock reaches its time.
+
+    Only the region of each frame which changed is kept, the player puts the
+    frames back together on its own copy of the LEDs image.
+    """
+
+    # How often a thread blocked on the player checks whether it is cancelled
+    CANCEL_CHECK_INTERVAL = 0.05
+
+    def __init__(self, show_frame, max_frames=512):
+        """
+        Args:
+            show_frame: Function called from the player thread with the LEDs
+                        image and the box which changed since the previous
+                        call, or None if unknown.
+            max_frames: Number of frames kept before the user code waits.
+        """
+        self._show_frame = show_frame
+        self.max_frames = max_frames
+
+        self._frames = deque()
+        self._frames_changed = threading.Condition()
+        self._image = None
+        self._full_frame_needed = True
+
+        self._player_thread = threading.Thread(target=self._thr_play)
+        self._player_thread.daemon = True
+        self._player_thread.start()
+
+    def put(self, timestamp, im, dirty_box=None):
+        """
+        Add a frame to be shown at `timestamp`. This blocks while the player
+        is full.
+
+        Args:
+            timestamp: The wall clock time at which to show the frame.
+            im: A PIL.Image.new object with the LEDs image.
+            dirty_box: The box of `im` which changed since the previous frame
+                       or None if unknown.
+        """
+        with self._frames_changed:
+            while len(self._frames) >= self.max_frames:
+                self._wait_cancellable()
+
+            if self._full_frame_needed:
+                self._full_frame_needed = False
+                dirty_box = None
+
+            if dirty_box:
+                self._frames.append((timestamp, dirty_box, im.crop(dirty_box)))
+            else:
+                self._frames.append((timestamp, None, im.copy()))
+
+            self._frames_changed.notify_all()
+
+    def drain(self):
+        """
+        Wait until all the frames have been shown.
+        """
+        with self._frames_changed:
+            while self._frames:
+                self._wait_cancellable()
+
+    def clear(self):
+        """
+        Forget the frames which were not shown yet.
+        """
+        with self._frames_changed:
+            self._frames.clear()
+            self._full_frame_needed = True
+            self._frames_changed.notify_all()
+
+    def _wait_cancellable(self):
+        # Must be called with the condition acquired
+        self._frames_changed.wait(self.CANCEL_CHECK_INTERVAL)
+        CodeThread.check_current()
+
+    def _thr_play(self):
+        while True:
+            with self._frames_changed:
+                while True:
+                    if not self._frames:
+                        self._frames_changed.wait()
+                        continue
+
+                    delay = self._frames[0][0] - time.time()
+                    if delay <= 0:
+                        break
+
+                    self._frames_changed.wait(delay)
+
+                timestamp, dirty_box, region = self._frames.popleft()
+                self._frames_changed.notify_all()
+
+            if dirty_box:
+                self._image.paste(region, dirty_box)
+            else:
+                self._image = region
+
+            self._show_frame(self._image, dirty_box)
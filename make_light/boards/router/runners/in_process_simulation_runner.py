@@ -0,0 +1,45 @@
+# in_process_simulation_runner.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Runs the simulation with the simulator drawn by the app itself
+
+
+from make_light.boards.router.runners.simulation_runner import SimulationRunner
+
+from make_light.paths import SIM_FRAMEBUFFER
+
+
+class InProcessSimulationRunner(SimulationRunner):
+    """
+    Runs the user code in a process without a window of its own
+    (code_process.py), which writes the frames to a SharedFramebuffer. They
+    are drawn by a SimulationView of the app rather than by a plug embedded
+    in a Gtk.Socket, so that only one GTK process is running.
+    """
+
+    PROCESS_SCRIPT = 'code_process.py'
+
+    def __init__(self, board, anim_view, debug=False):
+        SimulationRunner.__init__(self, board, anim_view, debug=debug)
+
+        self.connect('plug-loaded', self._on_process_loaded)
+
+    def start_animation_process(self):
+        self.anim_socket.set_board(self.board)
+        SimulationRunner.start_animation_process(self)
+
+    def _get_display_env(self):
+        return {'FRAMEBUFFER': SIM_FRAMEBUFFER}
+
+    def _attach_animation_process(self):
+        self.anim_socket.attach_framebuffer(SIM_FRAMEBUFFER)
+
+    def _on_process_loaded(self, runner=None):
+        # The framebuffer is only created once the process has loaded
+        self._attach_animation_process()
+
+    def destroy(self):
+        SimulationRunner.destroy(self)
+        self.anim_socket.detach_framebuffer()
@@ -20,6 +20,9 @@ from make_light.paths import SIM_PIPE
 
 class SimulationRunner(LightBoardRunner):
 
+    # Script of the animation process, in the directory of this module
+    PROCESS_SCRIPT = 'animation_plug.py'
+
     __gsignals__ = {
         'gif-encoded': (GObject.SIGNAL_RUN_LAST, GObject.TYPE_NONE, ()),
         'plug-loaded': (GObject.SIGNAL_RUN_LAST, GObject.TYPE_NONE, ()),
@@ -34,6 +37,23 @@ class SimulationRunner(LightBoardRunner):
         self.anim_process = None
         self._available = True
 
+        # Window of the plug shown by the animation process, to embed it into
+        # the sockets which are set later
+        self._plug_window_id = None
+
+    def set_anim_socket(self, anim_socket):
+        """
+        Show the simulator in another socket, e.g. when the user moves to
+        another view. The animation process keeps running and is attached to
+        the socket by start_animation_process(), once it is realized
+        """
+        self.anim_socket = anim_socket
+
+    def is_process_alive(self):
+        return (
+            self.anim_process is not None and self.anim_process.poll() is None
+        )
+
     def run_code(self):
         """
         Send a signal to the Animation process to start the animation
@@ -87,9 +107,15 @@ class SimulationRunner(LightBoardRunner):
                 error_text = error_text.decode('string_escape')
                 GObject.idle_add(self.emit, "finished-run", error_text)
 
+            elif command == 'ANIMATION-NOT-STOPPED':
+                GObject.idle_add(self._restart_animation_process)
+
             elif command == 'LOADING-COMPLETE':
                 GObject.idle_add(self.emit, 'plug-loaded')
 
+            elif command.startswith('PLUG-WINDOW '):
+                self._plug_window_id = int(command.split()[1])
+
             else:
                 try:
                     # we have just received a Standard Error
@@ -107,11 +133,18 @@ class SimulationRunner(LightBoardRunner):
 
     def start_animation_process(self):
         """
-        Starts the animation process in the background
+        Starts the animation process in the background, unless it is already
+        running, in which case it is attached to the current socket
         """
+        if self.is_process_alive():
+            self._attach_animation_process()
+            return
+
+        self._plug_window_id = None
+
         script_path = os.path.join(
             os.path.dirname(os.path.realpath(__file__)),
-            "animation_plug.py"
+            self.PROCESS_SCRIPT
         )
 
         # Setup how we are going to start the separate process
@@ -126,7 +159,7 @@ class SimulationRunner(LightBoardRunner):
         command = ['python', script_path, debug_parameter]
         new_env = os.environ.copy()
         new_env['POWERUP_TEST'] = '1'
-        new_env['PLUG_ID'] = str(self.anim_socket.get_id())
+        new_env.update(self._get_display_env())
         new_env['BOARD'] = self.board.NAME
 
         # TODO: Remove this?
@@ -153,8 +186,20 @@ class SimulationRunner(LightBoardRunner):
         self.thread_id_animation_complete.daemon = True
         self.thread_id_animation_complete.start()
 
+    def _get_display_env(self):
+        """
+        Environment variables which tell the animation process where to
+        display the animation
+        """
+        return {'PLUG_ID': str(self.anim_socket.get_id())}
+
+    def _attach_animation_process(self):
+        # Embed the plug, which hid itself when its last socket went away
+        if self._plug_window_id:
+            self.anim_socket.add_id(self._plug_window_id)
+
     def kill_animation_process(self):
-        if self.running:
+        if self.is_process_alive():
             self.stop_animation()
             self.anim_process.terminate()
             self.anim_process.poll()
@@ -162,14 +207,27 @@ class SimulationRunner(LightBoardRunner):
                 self.anim_process.kill()
 
     def kill_code(self):
+        """
+        Stop the user code. The animation process stops it and keeps running,
+        it is only restarted when the user code can't be stopped
+        """
         try:
-            # Only kill the process when it is still running
+            # Only stop the code when it is still running
             # as the AnimationPlug can run more than one process.
             if self.running:
-                self.kill_animation_process()
-                self.start_animation_process()
+                if self.is_process_alive():
+                    self.anim_process.stdin.write('STOP-ANIMATION\n')
+                else:
+                    self._restart_animation_process()
         except:
             print "kill_animation() failed"
 
+    def _restart_animation_process(self):
+        self.kill_animation_process()
+        self.start_animation_process()
+
+        self.running = False
+        self.emit('finished-run', '')
+
     def destroy(self):
         self.kill_animation_process()
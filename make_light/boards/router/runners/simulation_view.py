@@ -0,0 +1,192 @@
+# simulation_view.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# The widget which draws the simulation board and its LEDs
+
+
+import math
+
+from gi.repository import Gtk, Gdk, GdkPixbuf, GObject
+
+from make_light.boards.router.ipc import SharedFramebuffer
+
+
+class SimulationView(Gtk.DrawingArea):
+    """
+    SimulationView draws the board image with the LEDs of the simulator
+
+    The board image and the LED sprites are cached by the compositor of the
+    view, so that only the regions of the board which changed are composed
+    and redrawn.
+
+    Frames are either given to show_frame() or read from a SharedFramebuffer,
+    written by the process which runs the user code (see attach_framebuffer).
+
+    The view asks for the size of the board image. When it is given more room,
+    e.g. full screen, the board is drawn at the largest size which fits, with
+    the board layers and the LED sprites built once for that size.
+    """
+
+    # Maximum number of frames per second drawn on the screen
+    DISPLAY_RATE = 30
+
+    def __init__(self, board=None):
+        Gtk.DrawingArea.__init__(self)
+
+        self.board = None
+        self.compositor = None
+        self.pb = None
+
+        # Position of the board within the widget and the last frame shown,
+        # to draw it again when the board is scaled
+        self._origin = (0, 0)
+        self._board_size = None
+        self._last_frame = None
+
+        self._framebuffer = None
+        self._framebuffer_seq = None
+        self._poll_id = None
+
+        self.connect('draw', self._on_draw)
+        self.connect('size-allocate', self._on_size_allocate)
+        self.connect('destroy', self._on_destroy)
+
+        if board:
+            self.set_board(board)
+
+    def set_board(self, board):
+        """
+        Show the given simulation board, without any LEDs lit
+        """
+        self.board = board
+        self._last_frame = None
+        self._set_board_size()
+
+        self._board_size = (self.pb.get_width(), self.pb.get_height())
+        self.set_size_request(*self._board_size)
+
+    def _set_board_size(self, size=None):
+        """
+        Draw the board at the given (width, height), by default the size of
+        the board image, and show the last frame again
+        """
+        # The view keeps its own compositor, so that it only redraws the
+        # regions of the board which changed since the previous frame
+        self.compositor = self.board.create_compositor(size)
+        if self.compositor:
+            self.pb = self.board.bytes_to_pixbuf(*self.compositor.get_bytes())
+        else:
+            self.pb = GdkPixbuf.Pixbuf.new_from_file(
+                self.board.BOARD_IMAGE_PATH
+            )
+
+        self._update_origin()
+        self.queue_draw()
+
+        if self._last_frame:
+            self.show_frame(self._last_frame)
+
+    def show_frame(self, im, dirty_box=None):
+        """
+        Draw the LEDs image of the board. Only the region of the board which
+        changed is composed and copied onto the displayed board, then only
+        that region of the widget is redrawn
+
+        Must be called from the GTK thread. `dirty_box` is the box of the LEDs
+        image which changed since the previous frame, or None if unknown.
+        """
+        self._last_frame = im
+
+        if not self.compositor:
+            self.pb = self.board.compose_image(im)
+            self.queue_draw()
+            return
+
+        box = self.compositor.update(im, dirty_box)
+        if not box:
+            return
+
+        region = self.board.bytes_to_pixbuf(*self.compositor.get_bytes(box))
+        x, y = box[:2]
+        width, height = region.get_width(), region.get_height()
+
+        region.copy_area(0, 0, width, height, self.pb, x, y)
+        self.queue_draw_area(
+            x + self._origin[0], y + self._origin[1], width, height
+        )
+
+    def attach_framebuffer(self, path, display_rate=None):
+        """
+        Show the frames written to the SharedFramebuffer at `path`, checking
+        for a new one at most `display_rate` times per second
+        """
+        self.detach_framebuffer()
+
+        self._framebuffer = SharedFramebuffer(path)
+        self._framebuffer_seq = None
+
+        interval = int(1000 / (display_rate or self.DISPLAY_RATE))
+        self._poll_id = GObject.timeout_add(interval, self._poll_framebuffer)
+
+    def detach_framebuffer(self):
+        if self._poll_id:
+            GObject.source_remove(self._poll_id)
+            self._poll_id = None
+
+        if self._framebuffer:
+            self._framebuffer.close()
+            self._framebuffer = None
+
+    def _poll_framebuffer(self):
+        frame = self._framebuffer.read(self._framebuffer_seq)
+        if frame:
+            self._framebuffer_seq, im, dirty_box = frame
+            self.show_frame(im, dirty_box)
+
+        return True
+
+    def _on_size_allocate(self, widget, allocation):
+        if not self.board or not self.compositor:
+            return
+
+        # Scale the board to fit, never below the size of the board image
+        width, height = self._board_size
+        scale = max(1.0, min(
+            float(allocation.width) / width, float(allocation.height) / height
+        ))
+        size = (int(width * scale), int(height * scale))
+
+        if size != (self.pb.get_width(), self.pb.get_height()):
+            self._set_board_size(size)
+        else:
+            self._update_origin()
+
+    def _update_origin(self):
+        # Center the board within the widget
+        allocation = self.get_allocation()
+        self._origin = (
+            max(0, (allocation.width - self.pb.get_width()) / 2),
+            max(0, (allocation.height - self.pb.get_height()) / 2)
+        )
+
+    def _on_draw(self, widget, cr):
+        if not self.pb:
+            return
+
+        # Only convert the region which needs to be redrawn
+        origin_x, origin_y = self._origin
+        x1, y1, x2, y2 = cr.clip_extents()
+        x, y = max(0, int(x1) - origin_x), max(0, int(y1) - origin_y)
+        width = min(self.pb.get_width(), int(math.ceil(x2)) - origin_x) - x
+        height = min(self.pb.get_height(), int(math.ceil(y2)) - origin_y) - y
+        if width <= 0 or height <= 0:
+            return
+
+        region = self.pb.new_subpixbuf(x, y, width, height)
+        Gdk.cairo_set_source_pixbuf(cr, region, x + origin_x, y + origin_y)
+        cr.paint()
+
+    def _on_destroy(self, widget=None):
+        self.detach_framebuffer()
@@ -0,0 +1,70 @@
+# user_code.py
+#
+# Copyright (C) 2016 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Runs the code written by the user on a simulation board
+
+
+import os
+import imp
+import sys
+
+from make_light.paths import SIM_PIPE, TEMP_DIR
+from make_light.boards.base.board import end_auto_flush
+from make_light.boards.base.code_thread import CodeCancelled
+
+
+def run_user_code(board, player=None):
+    """
+    Load the code written by the user as an embedded module (imp), which draws
+    on the given board.
+
+    The outcome is reported to the SimulationRunner of the app through stdout
+    and, for errors, the simulator pipe. Code stopped by the user (see
+    CodeThread) finishes like any other.
+
+    When the frames are shown by a FramePlayer, the animation only finishes
+    once they have all been shown.
+
+    The boards in auto flush mode send their last frame however the code
+    ends, as the postamble is skipped when it raises an error.
+    """
+    try:
+        board.all(False)
+        try:
+            imp.load_source(
+                "top", os.path.join(TEMP_DIR, "powerup-code-all.py")
+            )
+        finally:
+            end_auto_flush()
+
+        if player:
+            player.drain()
+    except CodeCancelled:
+        if player:
+            player.clear()
+
+        sys.stdout.write('ANIMATION-FINISHED\n')
+        sys.stdout.flush()
+    except:
+        if player:
+            player.clear()
+
+        import traceback
+        error_text = traceback.format_exc().encode('string_escape')
+
+        sys.stderr.write(error_text + '\n')
+        sys.stderr.flush()
+
+        sys.stdout.write('SCRIPT-ENCOUNTERED-ERROR\n')
+        sys.stdout.flush()
+
+        with open(SIM_PIPE, "w") as f:
+            f.write(error_text + '\n')
+            f.flush()
+
+    else:
+        # Send an ACKnowledge to the app that the animation has finished
+        sys.stdout.write('ANIMATION-FINISHED\n')
+        sys.stdout.flush()
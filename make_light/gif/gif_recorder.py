@@ -68,9 +68,15 @@ class GifRecorder(object):
         self._remove_leading_empty_frames()
         self._remove_trailing_empty_frames()
 
-        # saving frames as PNGs
+        # saving frames as PNGs, composed by a compositor of our own so that
+        # only the LEDs changing between frames are drawn again
+        board = BOARD_ROUTER.board
+        compositor = board.create_compositor()
+
         for index in xrange(0, len(self.frames)):
-            pixbuf = BOARD_ROUTER.board.image_to_pixbuf(self.frames[index])
+            pixbuf = board.image_to_pixbuf(
+                self.frames[index], compositor=compositor
+            )
             filename = os.path.join(
                 self.output_path, 'frame-{0:0>3}.png'.format(index)
             )
@@ -90,9 +90,10 @@ class LightIDE(Gtk.Box):
         simulator_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         simulator_box.set_margin_right(WINDOW_PADDING)
 
-        self.anim_socket = Gtk.Socket()
+        self.anim_socket = BOARD_ROUTER.create_animation_socket()
         self.anim_socket.connect('realize', self._on_show)
-        self.anim_socket.connect("plug-removed", lambda x: True)
+        if isinstance(self.anim_socket, Gtk.Socket):
+            self.anim_socket.connect("plug-removed", lambda x: True)
         simulator_box.pack_start(self.anim_socket, False, False, 0)
 
         BOARD_ROUTER.set_animation_socket(self.anim_socket)
@@ -75,6 +75,9 @@ CO_CHAL_COVER_FMT = join('..', 'challenge_covers', '{id_str}.png')
 # Simulator Pipe
 SIM_PIPE = join(TEMP_DIR, 'make-light-simulator.pipe')
 
+# Frames of the user code shown by the in-process simulator
+SIM_FRAMEBUFFER = join(TEMP_DIR, 'make-light-simulator.fb')
+
 # create the TEMP and LOCAL folders
 ensure_dir(TEMP_DIR)
 chown_path(TEMP_DIR)